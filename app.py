@@ -1,39 +1,56 @@
-import pytesseract
-import pdfplumber
-from docx import Document
-from PIL import Image, ImageEnhance
 import os
-from flask import Flask, request, render_template_string, session, send_file
+import logging
+import time
+from flask import Flask, Request, request, render_template_string, session, send_file, jsonify, url_for, Response, stream_with_context, g
 import io
-from googletrans import Translator, LANGUAGES
-import sqlite3
-from datetime import datetime
+import json
+from urllib.parse import quote
+from core.languages import LANGUAGES
+from core.translation_cache import TranslationCache
+from core.extraction_cache import ExtractionCache
+from core import translation, metrics
+from core.translator_client import get_client
+from core.language_id import detect_language
+from core.extraction import extract_text, supported_extensions
+from core.documents import supports_round_trip
+from core.pipeline import FilePipeline
+from core.jobs import JobQueue, pending_files
+from core.ingest import ingest_files, UploadSpool, UploadTooLarge, MAX_REQUEST_SIZE
+from core.result_store import ResultStore
+from core.history import init_db, save_to_history, get_history, get_history_entry, history_batch
+from core.storage import close_connections
 
-# Set Tesseract path (uncomment if needed)
-# pytesseract.pytesseract.tesseract_cmd = '/opt/homebrew/bin/tesseract'
+UPLOAD_FOLDER = 'uploads'
+
+# Request whose multipart parser writes each file into an UploadSpool, so the per-file
+# limit is enforced while the body is parsed and ingest_files takes the spooled upload
+# over instead of copying it. Spools that are never taken over are dropped at teardown.
+class UploadRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        spool = UploadSpool(filename, spool_dir=UPLOAD_FOLDER)
+        if not hasattr(self, 'upload_spools'):
+            self.upload_spools = []
+        self.upload_spools.append(spool)
+        return spool
 
 # Set up Flask app
 app = Flask(__name__)
+app.request_class = UploadRequest
 app.secret_key = 'your_secret_key'
-UPLOAD_FOLDER = 'uploads'
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 4))
+# Log one line per request with its stage timings when set
+TRACE_REQUESTS = os.environ.get('TRACE_REQUESTS', '') not in ('', '0', 'false')
+# Reject oversized requests from their Content-Length before reading the body
+app.config['MAX_CONTENT_LENGTH'] = MAX_REQUEST_SIZE
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# Upload filter follows the registered extractors
+app.jinja_env.globals['accepted_extensions'] = ','.join(supported_extensions())
 
 # Set up SQLite database
-def init_db():
-    conn = sqlite3.connect('translations.db')
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS translations
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  filename TEXT,
-                  original_text TEXT,
-                  translated_text TEXT,
-                  detected_language TEXT,
-                  target_language TEXT,
-                  timestamp TEXT)''')
-    conn.commit()
-    conn.close()
-
 init_db()
+translation_cache = TranslationCache()
+extraction_cache = ExtractionCache()
+result_store = ResultStore()
 
 # HTML template
 HTML_TEMPLATE = '''
@@ -50,6 +67,8 @@ HTML_TEMPLATE = '''
         select, input[type="file"], input[type="submit"], input[type="button"] { margin: 10px 0; padding: 8px; border-radius: 4px; width: 100%; box-sizing: border-box; }
         input[type="submit"], input[type="button"] { padding: 10px 20px; background: #4CAF50; color: white; border: none; cursor: pointer; font-size: 16px; }
         input[type="submit"]:hover, input[type="button"]:hover { background: #45a049; }
+        input[type="text"] { margin: 10px 0; padding: 8px; border-radius: 4px; width: 100%; box-sizing: border-box; }
+        form.history-search { max-width: none; margin: 0; padding: 0; box-shadow: none; }
         .error { color: red; font-weight: bold; }
         form { max-width: 800px; margin: 0 auto; background: inherit; padding: 20px; border-radius: 8px; box-shadow: 0 2px 5px rgba(0,0,0,0.1); }
         a.download-btn { display: inline-block; margin: 10px 5px; padding: 10px 20px; background: #007bff; color: white; text-decoration: none; border-radius: 4px; }
@@ -74,9 +93,154 @@ HTML_TEMPLATE = '''
             } else {
                 document.body.classList.add('light');
             }
-            document.getElementById('uploadForm').addEventListener('submit', function() {
+            document.getElementById('uploadForm').addEventListener('submit', submitJob);
+        }
+        // Submit the upload as a background job and poll it instead of blocking on the POST
+        function submitJob(event) {
+            if (!window.fetch || !window.FormData) {
                 document.getElementById('spinner').style.display = 'block';
+                return;
+            }
+            event.preventDefault();
+            var form = event.target;
+            var status = document.getElementById('jobStatus');
+            document.getElementById('spinner').style.display = 'block';
+            status.textContent = 'Uploading...';
+            fetch('/jobs', { method: 'POST', body: new FormData(form) })
+                .then(function(response) { return response.json(); })
+                .then(function(data) {
+                    if (data.error) {
+                        throw new Error(data.error);
+                    }
+                    var zip = document.getElementById('jobZip');
+                    zip.href = data.zip_url;
+                    zip.style.display = 'none';
+                    if (window.EventSource) {
+                        streamJob(data, form.elements['language'].value);
+                    } else {
+                        pollJob(data.status_url, form.elements['language'].value);
+                    }
+                })
+                .catch(function(err) {
+                    document.getElementById('spinner').style.display = 'none';
+                    status.textContent = '';
+                    showError(err.message);
+                });
+        }
+        // Show each file's result as soon as the server pushes it
+        function streamJob(data, language) {
+            var job = { id: data.job_id, status: 'running', files: [] };
+            var source = new EventSource(data.events_url);
+            source.addEventListener('file', function(event) {
+                var file = JSON.parse(event.data);
+                job.files[file.position] = file;
+                job.files = job.files.map(function(f, i) { return f || { position: i, filename: '', status: 'queued' }; });
+                document.getElementById('jobStatus').textContent = 'Processed ' + file.completed + ' of ' + file.file_count + ' files';
+                renderJob(job, language);
             });
+            source.addEventListener('done', function() {
+                source.close();
+                document.getElementById('spinner').style.display = 'none';
+                document.getElementById('jobZip').style.display = '';
+            });
+            source.onerror = function() {
+                // Fall back to polling if the stream breaks
+                source.close();
+                pollJob(data.status_url, language);
+            };
+        }
+        function pollJob(url, language) {
+            fetch(url)
+                .then(function(response) { return response.json(); })
+                .then(function(job) {
+                    document.getElementById('jobStatus').textContent = 'Processed ' + job.completed + ' of ' + job.file_count + ' files';
+                    renderJob(job, language);
+                    if (job.status === 'done') {
+                        document.getElementById('spinner').style.display = 'none';
+                        document.getElementById('jobZip').style.display = '';
+                    } else {
+                        setTimeout(function() { pollJob(url, language); }, 1000);
+                    }
+                })
+                .catch(function(err) {
+                    setTimeout(function() { pollJob(url, language); }, 3000);
+                });
+        }
+        function cell(row, child) {
+            var td = document.createElement('td');
+            if (typeof child === 'string') {
+                td.textContent = child;
+            } else {
+                td.appendChild(child);
+            }
+            row.appendChild(td);
+            return td;
+        }
+        function renderJob(job, language) {
+            var table = document.getElementById('jobResults');
+            table.style.display = '';
+            while (table.rows.length > 1) {
+                table.deleteRow(1);
+            }
+            job.files.forEach(function(file) {
+                if (file.status !== 'done') {
+                    var row = table.insertRow();
+                    cell(row, file.filename);
+                    cell(row, '');
+                    cell(row, file.status === 'failed' ? 'Failed' : 'Processing...');
+                    cell(row, file.error || '');
+                    cell(row, '');
+                    cell(row, '');
+                    return;
+                }
+                // One row per target language of the file
+                var translations = file.translations && file.translations.length ? file.translations :
+                    [{ target_language: language, translated_text: file.translated_text, detected_language: file.detected_language }];
+                translations.forEach(function(translation) {
+                    var row = table.insertRow();
+                    cell(row, file.filename);
+                    var option = document.querySelector('#uploadForm select[name="language"] option[value="' + translation.target_language + '"]');
+                    cell(row, option ? option.textContent : translation.target_language);
+                    cell(row, translation.detected_language || '');
+                    var form = document.createElement('form');
+                    form.method = 'POST';
+                    form.action = '/retranslate';
+                    form.innerHTML = '<input type="hidden" name="language"><input type="hidden" name="filename"><textarea name="edited_text" rows="5"></textarea><input type="submit" value="Reload Translation">';
+                    form.elements['language'].value = translation.target_language;
+                    form.elements['filename'].value = file.filename;
+                    form.elements['edited_text'].value = file.original_text || '';
+                    cell(row, form);
+                    var pre = document.createElement('pre');
+                    pre.textContent = translation.translated_text || '';
+                    cell(row, pre);
+                    var link = document.createElement('a');
+                    link.href = '/jobs/' + job.id + '/download/' + file.position + '?language=' + encodeURIComponent(translation.target_language);
+                    link.className = 'download-btn';
+                    link.textContent = 'Download';
+                    var actions = cell(row, link);
+                    if (/[.]docx$/i.test(file.filename)) {
+                        var docx = document.createElement('a');
+                        docx.href = link.href + '&format=docx';
+                        docx.className = 'download-btn';
+                        docx.textContent = 'Download DOCX';
+                        actions.appendChild(docx);
+                    }
+                });
+            });
+        }
+        // History rows only carry previews; fetch the full texts when a row is opened
+        function openHistory(id, button) {
+            fetch('/history/' + id)
+                .then(function(response) { return response.json(); })
+                .then(function(entry) {
+                    document.getElementById('original-' + id).textContent = entry.original_text;
+                    document.getElementById('translated-' + id).textContent = entry.translated_text;
+                    button.style.display = 'none';
+                });
+        }
+        function showError(message) {
+            var error = document.getElementById('jobError');
+            error.textContent = message;
         }
     </script>
 </head>
@@ -84,20 +248,41 @@ HTML_TEMPLATE = '''
     <button onclick="toggleTheme()" class="theme-toggle">Change Theme</button>
     <h1>File Translator</h1>
     <form id="uploadForm" method="POST" enctype="multipart/form-data" action="/">
-        <input type="file" name="files" accept=".jpg,.jpeg,.png,.pdf,.doc,.docx,.txt" multiple required>
+        <input type="file" name="files" accept="{{ accepted_extensions }}" multiple required>
         <select name="language" required>
             <option value="">Select Target Language</option>
             {% for code, name in languages.items() %}
                 <option value="{{ code }}" {% if code == selected_language %}selected{% endif %}>{{ name }}</option>
             {% endfor %}
         </select>
+        <label for="extraLanguages">Also translate into (optional)</label>
+        <select id="extraLanguages" name="extra_languages" multiple size="5">
+            {% for code, name in languages.items() %}
+                <option value="{{ code }}" {% if code in session.get('extra_languages', []) %}selected{% endif %}>{{ name }}</option>
+            {% endfor %}
+        </select>
         <input type="submit" value="Translate">
     </form>
     <div id="spinner" class="spinner"></div>
+    <p id="jobStatus"></p>
+    <p id="jobError" class="error"></p>
+    <a id="jobZip" class="download-btn" style="display: none;">Download all (ZIP)</a>
+    <table id="jobResults" style="display: none;">
+        <tr>
+            <th>File Name</th>
+            <th>Target Language</th>
+            <th>Detected Language</th>
+            <th>Original Text</th>
+            <th>Translated Text</th>
+            <th>Actions</th>
+        </tr>
+    </table>
     {% if results %}
+        <a href="/download/all.zip" class="download-btn">Download all (ZIP)</a>
         <table>
             <tr>
                 <th>File Name</th>
+                <th>Target Language</th>
                 <th>Detected Language</th>
                 <th>Original Text</th>
                 <th>Translated Text</th>
@@ -106,23 +291,33 @@ HTML_TEMPLATE = '''
             {% for result in results %}
                 <tr>
                     <td>{{ result.filename }}</td>
+                    <td>{{ languages.get(result.target_language or selected_language, '') }}</td>
                     <td>{{ result.detected_language }}</td>
                     <td>
                         <form method="POST" action="/retranslate">
-                            <input type="hidden" name="language" value="{{ selected_language }}">
+                            <input type="hidden" name="language" value="{{ result.target_language or selected_language }}">
                             <input type="hidden" name="filename" value="{{ result.filename }}">
                             <textarea name="edited_text" rows="5">{{ result.original_text }}</textarea>
                             <input type="submit" value="Reload Translation">
                         </form>
                     </td>
                     <td><pre>{{ result.translated_text }}</pre></td>
-                    <td><a href="/download/{{ loop.index0 }}" class="download-btn">Download</a></td>
+                    <td>
+                        <a href="/download/{{ loop.index0 }}" class="download-btn">Download</a>
+                        {% if result.filename.lower().endswith('.docx') %}
+                            <a href="/download/{{ loop.index0 }}?format=docx" class="download-btn">Download DOCX</a>
+                        {% endif %}
+                    </td>
                 </tr>
             {% endfor %}
         </table>
     {% endif %}
+    <h2>Translation History</h2>
+    <form method="GET" action="/" class="history-search">
+        <input type="text" name="q" value="{{ search or '' }}" placeholder="Search original or translated text">
+        <input type="submit" value="Search">
+    </form>
     {% if history %}
-        <h2>Translation History</h2>
         <table>
             <tr>
                 <th>Timestamp</th>
@@ -138,11 +333,19 @@ HTML_TEMPLATE = '''
                     <td>{{ entry.filename }}</td>
                     <td>{{ entry.detected_language }}</td>
                     <td>{{ entry.target_language }}</td>
-                    <td><pre>{{ entry.original_text }}</pre></td>
-                    <td><pre>{{ entry.translated_text }}</pre></td>
+                    <td><pre id="original-{{ entry.id }}">{{ entry.original_text }}{% if entry.truncated %}...{% endif %}</pre></td>
+                    <td>
+                        <pre id="translated-{{ entry.id }}">{{ entry.translated_text }}{% if entry.truncated %}...{% endif %}</pre>
+                        {% if entry.truncated %}<input type="button" value="Show full text" onclick="openHistory({{ entry.id }}, this)">{% endif %}
+                    </td>
                 </tr>
             {% endfor %}
         </table>
+        {% if next_cursor %}
+            <a href="/?before={{ next_cursor | urlencode }}{% if search %}&q={{ search | urlencode }}{% endif %}" class="download-btn">Older entries</a>
+        {% endif %}
+    {% elif search %}
+        <p>No history entries match your search.</p>
     {% endif %}
     {% if error %}
         <p class="error">{{ error }}</p>
@@ -151,91 +354,53 @@ HTML_TEMPLATE = '''
 </html>
 '''
 
-# Function to preprocess image
-def preprocess_image(image_path):
-    try:
-        img = Image.open(image_path)
-        img = img.convert('L')
-        enhancer = ImageEnhance.Contrast(img)
-        img = enhancer.enhance(2.0)
-        temp_path = os.path.join(UPLOAD_FOLDER, f"processed_{os.path.basename(image_path)}")
-        img.save(temp_path)
-        return temp_path
-    except Exception as e:
-        return image_path
-
-# Function to extract text from files
-def extract_text(file_path):
-    ext = os.path.splitext(file_path)[1].lower()
-    if ext in ['.jpg', '.jpeg', '.png']:
-        try:
-            processed_path = preprocess_image(file_path)
-            text = pytesseract.image_to_string(Image.open(processed_path))
-            if processed_path != file_path:
-                os.remove(processed_path)
-            return text if text.strip() else "No text found in image"
-        except Exception as e:
-            return f"Error processing image: {str(e)}"
-    elif ext == '.pdf':
-        try:
-            with pdfplumber.open(file_path) as pdf:
-                text = ''
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + '\n'
-                return text if text.strip() else "No text found in PDF"
-        except Exception as e:
-            return f"Error processing PDF: {str(e)}"
-    elif ext in ['.doc', '.docx']:
-        try:
-            doc = Document(file_path)
-            text = '\n'.join([para.text for para in doc.paragraphs if para.text.strip()])
-            return text if text.strip() else "No text found in DOC"
-        except Exception as e:
-            return f"Error processing DOC: {str(e)}"
-    elif ext == '.txt':
-        try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                text = file.read()
-                return text if text.strip() else "No text found in TXT"
-        except Exception as e:
-            return f"Error processing TXT: {str(e)}"
-    else:
-        return "Unsupported file format"
+# Function to translate text with language detection, through the shared cache
+def translate_text(text, target_language, detection=None):
+    return translation.translate_text(text, target_language, translation_cache, detection)
 
-# Function to translate text with language detection
-def translate_text(text, target_language):
-    if not text or text.startswith("Error") or text.startswith("No text found"):
-        return text, "N/A"
-    try:
-        translator = Translator()
-        detected = translator.detect(text)
-        language = LANGUAGES.get(detected.lang, "Unknown") if detected.lang else "Unknown"
-        translated = translator.translate(text, dest=target_language)
-        return translated.text, language
-    except Exception as e:
-        return f"Error during translation: {str(e)}", "N/A"
-
-# Function to save translation to history
-def save_to_history(filename, original_text, translated_text, detected_language, target_language):
-    conn = sqlite3.connect('translations.db')
-    c = conn.cursor()
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    c.execute('''INSERT INTO translations (filename, original_text, translated_text, detected_language, target_language, timestamp)
-                 VALUES (?, ?, ?, ?, ?, ?)''',
-              (filename, original_text, translated_text, detected_language, LANGUAGES.get(target_language, "Unknown"), timestamp))
-    conn.commit()
-    conn.close()
-
-# Function to get translation history
-def get_history():
-    conn = sqlite3.connect('translations.db')
-    c = conn.cursor()
-    c.execute('SELECT timestamp, filename, detected_language, target_language, original_text, translated_text FROM translations ORDER BY timestamp DESC')
-    history = [{'timestamp': row[0], 'filename': row[1], 'detected_language': row[2], 'target_language': row[3], 'original_text': row[4], 'translated_text': row[5]} for row in c.fetchall()]
-    conn.close()
-    return history
+# Shared extract/translate pipeline, created on first use so worker processes
+# are not started when the module is only imported
+_pipeline = None
+
+def get_pipeline():
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = FilePipeline(extract_text, translate_text, extraction_cache=extraction_cache, detect_fn=detect_language)
+    return _pipeline
+
+# Function to run one job file through the shared pipeline into every target language
+def process_job_file(filename, data, target_languages):
+    return get_pipeline().submit_many((filename, data), target_languages).result()
+
+# Function to record every language of a finished job file in one history transaction
+def save_job_file(filename, original_text, translations):
+    with history_batch():
+        for target_language, (translated_text, detected_language) in translations.items():
+            save_to_history(filename, original_text, translated_text, detected_language, target_language)
+
+# Function to read the target languages of a form: the main language first, then any extra ones
+def requested_languages(form):
+    return list(dict.fromkeys(code for code in form.getlist('language') + form.getlist('extra_languages') if code))
+
+# Function to check requested target languages; returns an error message or None
+def language_error(target_languages):
+    if not target_languages:
+        return "Please select a target language."
+    if any(code not in LANGUAGES for code in target_languages):
+        return "Selected language is not supported."
+    return None
+
+# Background job queue, started on first use (or at startup when unfinished jobs are waiting)
+# so only the serving process runs workers
+_job_queue = None
+
+def get_job_queue():
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue(process_job_file, workers=JOB_WORKERS, on_file_done=save_job_file,
+                              keep_source=supports_round_trip)
+        _job_queue.start()
+    return _job_queue
 
 # Flask route for file upload and initial translation
 @app.route('/', methods=['GET', 'POST'])
@@ -243,47 +408,61 @@ def upload_file():
     results = []
     error = None
     selected_language = session.get('selected_language', '')
-    history = get_history()
+    search = request.args.get('q')
+    history, next_cursor = get_history(before=request.args.get('before'), search=search)
 
     if request.method == 'POST':
         files = request.files.getlist('files')
-        target_language = request.form.get('language')
+        target_languages = requested_languages(request.form)
 
         if not files or all(not f or not f.filename for f in files):
             error = "No files uploaded or invalid files."
-        elif not target_language:
-            error = "Please select a target language."
-        elif target_language not in LANGUAGES:
-            error = "Selected language is not supported."
+        elif language_error(target_languages):
+            error = language_error(target_languages)
         else:
-            session['results'] = []
+            results = []
+            valid = []
             for file in files:
                 if file and file.filename and file.filename.strip():
-                    file_path = os.path.join(UPLOAD_FOLDER, file.filename)
-                    file.save(file_path)
-
-                    # Extract and translate
-                    original_text = extract_text(file_path)
-                    translated_text, detected_language = translate_text(original_text, target_language)
-                    session['results'].append({
-                        'filename': file.filename,
-                        'original_text': original_text,
-                        'translated_text': translated_text,
-                        'detected_language': detected_language
-                    })
-                    save_to_history(file.filename, original_text, translated_text, detected_language, target_language)
-
-                    # Clean up
-                    try:
-                        os.remove(file_path)
-                    except:
-                        pass
+                    valid.append(file)
                 else:
                     error = f"Invalid file: {file.filename if file else 'None'}"
-            session['selected_language'] = target_language
-            results = session.get('results', [])
 
-    return render_template_string(HTML_TEMPLATE, languages=LANGUAGES, results=results, error=error, selected_language=selected_language, history=history)
+            # Take over the uploads spooled while parsing; only PDFs are on disk, in uniquely named temp files
+            try:
+                uploads = ingest_files([(file.filename, file.stream) for file in valid], spool_dir=UPLOAD_FOLDER)
+            except UploadTooLarge as e:
+                error = str(e)
+                uploads = []
+
+            # Extract each file once and translate it into every language concurrently;
+            # results come back in upload order, one row per file and language
+            outputs = get_pipeline().run_many([upload.source() for upload in uploads], target_languages,
+                                              [upload.sha256 for upload in uploads])
+            sources = {}
+            with history_batch():
+                for upload, (original_text, translations) in zip(uploads, outputs):
+                    # Documents that can be written back keep their bytes for the DOCX download
+                    if supports_round_trip(upload.filename):
+                        sources[len(results)] = upload.read()
+                    for target_language, (translated_text, detected_language) in translations.items():
+                        results.append({
+                            'filename': upload.filename,
+                            'original_text': original_text,
+                            'translated_text': translated_text,
+                            'detected_language': detected_language,
+                            'target_language': target_language
+                        })
+                        save_to_history(upload.filename, original_text, translated_text, detected_language, target_language)
+
+                    # Clean up
+                    upload.cleanup()
+            # Only the opaque result id goes into the cookie session
+            session['results_id'] = result_store.create(results, sources)
+            session['selected_language'] = target_languages[0]
+            session['extra_languages'] = target_languages[1:]
+
+    return render_template_string(HTML_TEMPLATE, languages=LANGUAGES, results=results, error=error, selected_language=selected_language, history=history, next_cursor=next_cursor, search=search)
 
 # Flask route for retranslating edited text
 @app.route('/retranslate', methods=['POST'])
@@ -292,8 +471,8 @@ def retranslate():
     target_language = request.form.get('language')
     filename = request.form.get('filename')
     error = None
-    results = session.get('results', [])
-    history = get_history()
+    results = result_store.get(session.get('results_id'))
+    history, next_cursor = get_history()
 
     if not edited_text:
         error = "No text provided for translation."
@@ -301,33 +480,272 @@ def retranslate():
         error = "Invalid target language."
     else:
         translated_text, detected_language = translate_text(edited_text, target_language)
-        for result in results:
-            if result['filename'] == filename:
-                result['original_text'] = edited_text
-                result['translated_text'] = translated_text
-                result['detected_language'] = detected_language
-                break
-        session['results'] = results
+        edited = {
+            'filename': filename,
+            'original_text': edited_text,
+            'translated_text': translated_text,
+            'detected_language': detected_language,
+            'target_language': target_language
+        }
+        # Edited results from a background job are not in this session's store yet
+        position = next((i for i, result in enumerate(results)
+                         if result['filename'] == filename and result.get('target_language') in (None, target_language)), None)
+        if 'results_id' not in session or not results:
+            session['results_id'] = result_store.create([edited])
+            results = [edited]
+        else:
+            result_store.put(session['results_id'], edited, position)
+            if position is None:
+                results.append(edited)
+            else:
+                results[position] = edited
         session['selected_language'] = target_language
         save_to_history(filename, edited_text, translated_text, detected_language, target_language)
 
-    return render_template_string(HTML_TEMPLATE, languages=LANGUAGES, results=results, error=error, selected_language=target_language, history=history)
+    return render_template_string(HTML_TEMPLATE, languages=LANGUAGES, results=results, error=error, selected_language=target_language, history=history, next_cursor=next_cursor)
+
+# Function to send a translated copy of a document, keeping its layout. document is the copy
+# rendered by an earlier download, if any; otherwise get_source() supplies the original bytes
+# and save(output) keeps the rendered copy for the next download.
+def send_translated_document(filename, target_language, document, get_source, save):
+    if document is None:
+        data = get_source()
+        if data is None or not target_language:
+            return "Document not available", 404
+        document, _ = translation.translate_document(data, target_language, translation_cache)
+        save(document)
+    return send_file(io.BytesIO(document), download_name=f"translated_{filename}", as_attachment=True,
+                     mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document')
 
-# Route for downloading translated text
+# Route for downloading translated text, or with ?format=docx the translated document
 @app.route('/download/<int:index>')
 def download_file(index):
-    results = session.get('results', [])
-    if index < len(results):
-        result = results[index]['translated_text']
-        buffer = io.StringIO(result)
-        buffer.seek(0)
-        return send_file(
-            io.BytesIO(buffer.getvalue().encode('utf-8')),
-            download_name=f"translated_{results[index]['filename']}.txt",
-            as_attachment=True
-        )
-    return "File not found", 404
+    results_id = session.get('results_id')
+    described = result_store.describe(results_id, index) if results_id else None
+    if described is None or not described[1]:
+        return "File not found", 404
+    if request.args.get('format') == 'docx':
+        target_language = described[2] or session.get('selected_language')
+        return send_translated_document(described[0], target_language, result_store.get_document(results_id, index),
+                                        lambda: result_store.get_source(results_id, index),
+                                        lambda document: result_store.put_document(results_id, index, document))
+    # Stream the text out of the result store instead of building it in memory
+    response = Response(stream_with_context(result_store.iter_translated(results_id, index)), mimetype='text/plain; charset=utf-8')
+    response.headers['Content-Disposition'] = f"attachment; filename=\"translated_{quote(described[0])}.txt\""
+    return response
+
+# Route for downloading every translated text of this session as one ZIP, a folder per language
+@app.route('/download/all.zip')
+def download_all():
+    results = result_store.get(session.get('results_id'))
+    entries = [(result['filename'], result.get('target_language') or session.get('selected_language'), result['translated_text'])
+               for result in results if result['translated_text'] is not None]
+    if not entries:
+        return "File not found", 404
+    return send_file(translation.zip_translations(entries), download_name='translations.zip', as_attachment=True, mimetype='application/zip')
+
+# Route for opening one history entry with its full texts
+@app.route('/history/<int:entry_id>')
+def history_entry(entry_id):
+    entry = get_history_entry(entry_id)
+    if entry is None:
+        return jsonify({'error': "History entry not found."}), 404
+    return jsonify(entry)
+
+# Route for queueing a translation job; returns immediately with the job id
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    files = request.files.getlist('files')
+    target_languages = requested_languages(request.form)
+
+    if not files or all(not f or not f.filename for f in files):
+        return jsonify({'error': "No files uploaded or invalid files."}), 400
+    if language_error(target_languages):
+        return jsonify({'error': language_error(target_languages)}), 400
+
+    try:
+        uploads = ingest_files([(f.filename, f.stream) for f in files if f and f.filename and f.filename.strip()])
+    except UploadTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    job_files = []
+    for upload in uploads:
+        job_files.append((upload.filename, upload.read()))
+        upload.cleanup()
+    job_id = get_job_queue().submit(job_files, target_languages)
+    session['selected_language'] = target_languages[0]
+    session['extra_languages'] = target_languages[1:]
+    return jsonify({'job_id': job_id, 'status_url': url_for('job_status', job_id=job_id),
+                    'events_url': url_for('job_events', job_id=job_id),
+                    'zip_url': url_for('download_job_zip', job_id=job_id)}), 202
+
+# Route for polling a job's per-file progress and results
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return jsonify({'error': "Job not found."}), 404
+    return jsonify(job)
+
+# Route streaming a job's progress as Server-Sent Events: one `file` event per
+# finished file as soon as it is ready, then a final `done` event
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    job_queue = get_job_queue()
+    if job_queue.get(job_id) is None:
+        return jsonify({'error': "Job not found."}), 404
+
+    def events():
+        sent = set()
+        while True:
+            job = job_queue.get(job_id)
+            for file in job['files']:
+                if file['status'] in ('done', 'failed') and file['position'] not in sent:
+                    sent.add(file['position'])
+                    yield f"event: file\ndata: {json.dumps(dict(file, job_id=job_id, completed=len(sent), file_count=job['file_count']))}\n\n"
+            if job['status'] == 'done':
+                yield f"event: done\ndata: {json.dumps({'job_id': job_id})}\n\n"
+                return
+            # Wake on local progress; the timeout also picks up work done by other processes
+            job_queue.wait_for_update(timeout=1.0)
+            yield ": keep-alive\n\n"
+
+    response = Response(stream_with_context(events()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# Route for downloading one translated file of a job; ?language= picks one of the job's languages
+@app.route('/jobs/<job_id>/download/<int:position>')
+def download_job_file(job_id, position):
+    job = get_job_queue().get(job_id)
+    if job is None or position >= len(job['files']) or job['files'][position]['status'] != 'done':
+        return "File not found", 404
+    result = job['files'][position]
+    target_language = request.args.get('language') or job['target_language']
+    translated_text = next((t['translated_text'] for t in result['translations'] if t['target_language'] == target_language),
+                           result['translated_text'] if target_language == job['target_language'] else None)
+    if translated_text is None:
+        return "File not found", 404
+    if request.args.get('format') == 'docx':
+        job_queue = get_job_queue()
+        return send_translated_document(result['filename'], target_language, job_queue.get_document(job_id, position, target_language),
+                                        lambda: job_queue.get_source(job_id, position),
+                                        lambda document: job_queue.put_document(job_id, position, target_language, document))
+    return send_file(
+        io.BytesIO(translated_text.encode('utf-8')),
+        download_name=f"translated_{result['filename']}.txt",
+        as_attachment=True
+    )
+
+# Route for downloading every finished file of a job in every language as one ZIP
+@app.route('/jobs/<job_id>/download.zip')
+def download_job_zip(job_id):
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return "Job not found", 404
+    entries = []
+    for file in job['files']:
+        if file['status'] != 'done':
+            continue
+        # Jobs finished before multi-language support only have the job_files result
+        translations = file['translations'] or [{'target_language': job['target_language'], 'translated_text': file['translated_text']}]
+        entries += [(file['filename'], t['target_language'], t['translated_text']) for t in translations]
+    if not entries:
+        return "File not found", 404
+    return send_file(translation.zip_translations(entries), download_name=f"translations_{job_id}.zip", as_attachment=True, mimetype='application/zip')
+
+# Request instrumentation: latency and status per route, plus optional trace logs
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    if TRACE_REQUESTS:
+        g.trace = metrics.start_trace()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    metrics.observe('request_seconds', elapsed, route=route, method=request.method)
+    metrics.inc('requests_total', route=route, method=request.method, status=response.status_code)
+    trace = g.pop('trace', None)
+    if trace is not None:
+        stages = {}
+        for name, labels, value in trace:
+            if name == 'stage_seconds':
+                stages[labels['stage']] = stages.get(labels['stage'], 0.0) + value
+        app.logger.info("trace %s %s %d %.3fs %s", request.method, request.path, response.status_code, elapsed,
+                        ' '.join(f"{stage}={seconds:.3f}s" for stage, seconds in sorted(stages.items())) or '-')
+    return response
+
+@app.teardown_request
+def end_request_trace(exc):
+    metrics.end_trace()
+
+# Function to close the request thread's pooled SQLite connections. The threaded server runs
+# each request on a thread of its own, so the connections would not be used again; worker
+# and pool threads keep theirs for as long as they run.
+@app.teardown_appcontext
+def close_request_connections(exc):
+    close_connections()
+
+# Values read from the caches, translation client and job queue at scrape time
+def collect_app_metrics():
+    cache = translation_cache.stats()
+    extraction = extraction_cache.stats()
+    client = get_client().stats()
+    samples = [
+        ('translation_cache_lookups_total', 'counter', "Translation cache lookups by result", {'result': 'memory_hit'}, cache['memory_hits']),
+        ('translation_cache_lookups_total', 'counter', "Translation cache lookups by result", {'result': 'disk_hit'}, cache['disk_hits']),
+        ('translation_cache_lookups_total', 'counter', "Translation cache lookups by result", {'result': 'miss'}, cache['misses']),
+        ('translation_cache_hit_ratio', 'gauge', "Share of translation cache lookups that hit", {}, cache['hit_rate']),
+        ('extraction_cache_lookups_total', 'counter', "Extraction cache lookups by result", {'result': 'hit'}, extraction['hits']),
+        ('extraction_cache_lookups_total', 'counter', "Extraction cache lookups by result", {'result': 'miss'}, extraction['misses']),
+        ('extraction_cache_hit_ratio', 'gauge', "Share of extraction cache lookups that hit", {}, extraction['hit_rate']),
+        ('extraction_cache_bytes', 'gauge', "Extracted text stored in the extraction cache", {}, extraction['bytes']),
+        ('backend_requests_total', 'counter', "Translation backend calls, including retries", {'backend': client['backend']}, client['requests']),
+        ('backend_retries_total', 'counter', "Translation backend retries", {'backend': client['backend']}, client['retries']),
+        ('backend_errors_total', 'counter', "Failed translation backend calls", {'backend': client['backend']}, client['errors']),
+        ('job_queue_depth', 'gauge', "Job files waiting to be processed", {}, _job_queue.queue_depth() if _job_queue is not None else 0),
+    ]
+    samples += [('backend_circuit_state', 'gauge', "Translation circuit breaker state (1 = current)", {'state': state}, int(client['circuit'] == state))
+                for state in ('closed', 'open', 'half-open')]
+    return samples
+
+metrics.REGISTRY.register_collector(collect_app_metrics)
+
+# Route exposing metrics in the Prometheus text format
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# Function to drop upload spools the request did not take over, e.g. after a file broke its limit
+@app.teardown_request
+def discard_upload_spools(exc):
+    for spool in getattr(request, 'upload_spools', []):
+        spool.discard()
+
+# Handler for a file rejected by the per-file limit while the upload was parsed
+@app.errorhandler(UploadTooLarge)
+def upload_too_large(e):
+    return request_too_large(e, str(e))
+
+# Handler for requests rejected by MAX_CONTENT_LENGTH
+@app.errorhandler(413)
+def request_too_large(e, message=None):
+    message = message or f"Upload exceeds the {MAX_REQUEST_SIZE // (1024 * 1024)} MB request limit"
+    if request.path.startswith('/jobs'):
+        return jsonify({'error': message}), 413
+    history, next_cursor = get_history()
+    return render_template_string(HTML_TEMPLATE, languages=LANGUAGES, results=[], error=message, selected_language=session.get('selected_language', ''), history=history, next_cursor=next_cursor), 413
+
+# Resume jobs left queued or running by a previous run now, rather than on the first /jobs request
+if pending_files():
+    get_job_queue()
 
 # Run the app
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,263 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from core.languages import LANGUAGES
+from core.storage import DB_PATH, transaction, close_connections
+from core.translation_cache import TranslationCache
+from core.extraction_cache import ExtractionCache, source_sha256
+from core.extraction import extract_text, supported_extensions, is_complete_extraction
+from core.pipeline import FilePipeline, EXTRACT_WORKERS, TRANSLATE_WORKERS
+from core import translation
+
+# Files in flight per extraction worker; bounds memory on very large trees
+IN_FLIGHT_PER_WORKER = 2
+
+logger = logging.getLogger('batch_translate')
+
+_cache = None
+
+
+# Runs on the pipeline's translation threads, sharing one segment cache
+def translate_text(text, target_language):
+    return translation.translate_text(text, target_language, _cache)
+
+
+# Function to turn a relative name into one that stays inside the output directory:
+# normalized, and reduced to the file name when it is absolute or climbs out with '..'
+def safe_relative_name(rel):
+    rel = os.path.normpath(rel)
+    if os.path.isabs(rel) or rel == os.pardir or rel.startswith(os.pardir + os.sep):
+        return os.path.basename(rel)
+    return rel
+
+
+# Function to make relative names unique: a name shared by different source files gets a
+# short hash of each source path, so no two inputs write the same output file
+def unique_relative_names(found):
+    sources = {}
+    for path, rel in found:
+        sources.setdefault(os.path.normcase(rel), set()).add(os.path.abspath(path))
+    unique = []
+    for path, rel in found:
+        if len(sources[os.path.normcase(rel)]) > 1:
+            stem, ext = os.path.splitext(rel)
+            rel = f"{stem}.{hashlib.sha256(os.path.abspath(path).encode('utf-8')).hexdigest()[:8]}{ext}"
+        unique.append((path, rel))
+    return unique
+
+
+# Function to check whether a path is one of the excluded paths or inside one of them
+def is_excluded(path, excluded):
+    real = os.path.realpath(path)
+    return any(real == other or real.startswith(other.rstrip(os.sep) + os.sep) for other in excluded)
+
+
+# Function to list (path, relative_name) pairs from directories, files and manifests.
+# A manifest holds one path per line (relative to the manifest), '#' starts a comment.
+# Relative names decide the output paths, so they are kept unique and inside the output directory.
+# exclude lists paths never to pick up, such as the output directory and the report, so a
+# rerun does not translate its own outputs.
+def discover_files(inputs, manifest=None, exclude=()):
+    excluded = [os.path.realpath(path) for path in exclude]
+    found = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, dirs, files in os.walk(item):
+                dirs[:] = sorted(name for name in dirs if not is_excluded(os.path.join(root, name), excluded))
+                for name in sorted(files):
+                    path = os.path.join(root, name)
+                    found.append((path, os.path.relpath(path, item)))
+        else:
+            found.append((item, os.path.basename(item)))
+    if manifest:
+        base = os.path.dirname(os.path.abspath(manifest))
+        with open(manifest, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                path = line if os.path.isabs(line) else os.path.join(base, line)
+                found.append((path, line))
+    found = [(path, safe_relative_name(rel)) for path, rel in found
+             if path.lower().endswith(supported_extensions()) and not is_excluded(path, excluded)]
+    return unique_relative_names(found)
+
+
+def output_path_for(output_dir, rel, target_language):
+    return os.path.join(output_dir, f"{rel}.{target_language}.txt")
+
+
+# Returns (output_path, detected_language) if this content was already translated
+def lookup_checkpoint(sha256, target_language, db_path=DB_PATH):
+    with transaction(db_path) as c:
+        c.execute('SELECT output_path, detected_language FROM batch_files WHERE sha256 = ? AND target_language = ?',
+                  (sha256, target_language))
+        return c.fetchone()
+
+
+def record_checkpoint(sha256, target_language, source_path, output_path, detected_language, db_path=DB_PATH):
+    with transaction(db_path) as c:
+        c.execute('''INSERT OR REPLACE INTO batch_files (sha256, target_language, source_path, output_path, detected_language, completed_at)
+                     VALUES (?, ?, ?, ?, ?, ?)''',
+                  (sha256, target_language, source_path, output_path, detected_language, time.time()))
+
+
+def write_output(path, text):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.part'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    # Rename last so a crash never leaves a truncated output behind
+    os.replace(tmp_path, path)
+
+
+# Appends one JSON line per file and flushes it, so the report survives a crash
+class Report:
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+        self.counts = {}
+
+    def write(self, **entry):
+        self.counts[entry['status']] = self.counts.get(entry['status'], 0) + 1
+        self._file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+# Function to reuse a previous result for identical content, copying its output if needed
+def reuse_checkpoint(path, rel, sha256, found, output_dir, target_language, report):
+    output_path = output_path_for(output_dir, rel, target_language)
+    previous_output, detected_language = found
+    if previous_output != output_path and not os.path.exists(output_path) and os.path.exists(previous_output):
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        shutil.copyfile(previous_output, output_path)
+    report.write(path=path, sha256=sha256, target_language=target_language, status='skipped',
+                 output=output_path if os.path.exists(output_path) else previous_output,
+                 detected_language=detected_language)
+
+
+# Function to translate every discovered file, skipping content already done for this target
+def run_batch(files, target_language, output_dir, report, pipeline, db_path=DB_PATH, max_in_flight=None):
+    max_in_flight = max_in_flight or max(1, EXTRACT_WORKERS * IN_FLIGHT_PER_WORKER)
+    in_flight = {}
+    hashes_in_flight = set()
+    duplicates = []
+
+    def finish(future):
+        path, rel, sha256, started = in_flight.pop(future)
+        hashes_in_flight.discard(sha256)
+        try:
+            original_text, translated_text, detected_language = future.result()
+        except Exception as e:
+            original_text, translated_text, detected_language = f"Error processing file: {str(e)}", '', "N/A"
+        entry = dict(path=path, sha256=sha256, target_language=target_language,
+                     detected_language=detected_language, chars=len(original_text),
+                     seconds=round(time.monotonic() - started, 3))
+        # Failed files are not checkpointed, so the next run retries them
+        if original_text.startswith("Error") or original_text == "Unsupported file format":
+            report.write(status='failed', error=original_text, **entry)
+        elif translated_text.startswith("Error during translation"):
+            report.write(status='failed', error=translated_text, **entry)
+        elif original_text.startswith("No text found"):
+            report.write(status='empty', **entry)
+        elif not is_complete_extraction(original_text):
+            # Some pages failed OCR: keep what was read, but leave the file for the next run to retry
+            output_path = output_path_for(output_dir, rel, target_language)
+            write_output(output_path, translated_text)
+            report.write(status='partial', output=output_path, error=original_text.split('\n', 1)[0], **entry)
+        else:
+            output_path = output_path_for(output_dir, rel, target_language)
+            write_output(output_path, translated_text)
+            record_checkpoint(sha256, target_language, path, output_path, detected_language, db_path)
+            report.write(status='done', output=output_path, **entry)
+
+    for path, rel in files:
+        try:
+            # Same hash as the extraction cache uses, so both key the file identically
+            sha256 = source_sha256((path,))
+        except OSError as e:
+            report.write(path=path, target_language=target_language, status='failed', error=str(e))
+            continue
+        found = lookup_checkpoint(sha256, target_language, db_path)
+        if found is not None:
+            reuse_checkpoint(path, rel, sha256, found, output_dir, target_language, report)
+            continue
+        if sha256 in hashes_in_flight:
+            # Same content is already being translated; settle it once that finishes
+            duplicates.append((path, rel, sha256))
+            continue
+        while len(in_flight) >= max_in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                finish(future)
+        future = pipeline.submit(path, target_language, sha256)
+        in_flight[future] = (path, rel, sha256, time.monotonic())
+        hashes_in_flight.add(sha256)
+
+    while in_flight:
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            finish(future)
+
+    for path, rel, sha256 in duplicates:
+        found = lookup_checkpoint(sha256, target_language, db_path)
+        if found is not None:
+            reuse_checkpoint(path, rel, sha256, found, output_dir, target_language, report)
+        else:
+            report.write(path=path, sha256=sha256, target_language=target_language, status='failed',
+                         error="Identical file failed earlier in this run")
+    return report.counts
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Translate directories of documents without the web UI.")
+    parser.add_argument('inputs', nargs='*', help="Files or directories to translate")
+    parser.add_argument('-m', '--manifest', help="Text file listing one input path per line")
+    parser.add_argument('-t', '--target', required=True, help="Target language code, e.g. 'fr'")
+    parser.add_argument('-o', '--output-dir', default='translated', help="Where translated .txt files are written")
+    parser.add_argument('-r', '--report', help="JSONL report path (default: <output-dir>/report.jsonl)")
+    parser.add_argument('-w', '--workers', type=int, default=EXTRACT_WORKERS, help="Extraction worker processes")
+    parser.add_argument('--translate-workers', type=int, default=TRANSLATE_WORKERS, help="Translation threads")
+    parser.add_argument('--db', default=DB_PATH, help="SQLite database holding the checkpoint and translation cache")
+    args = parser.parse_args(argv)
+    if not args.inputs and not args.manifest:
+        parser.error("give at least one input path or --manifest")
+    if args.target not in LANGUAGES:
+        parser.error(f"unknown target language: {args.target}")
+    return args
+
+
+def main(argv=None):
+    global _cache
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    _cache = TranslationCache(db_path=args.db)
+    report_path = args.report or os.path.join(args.output_dir, 'report.jsonl')
+    files = discover_files(args.inputs, args.manifest, exclude=(args.output_dir, report_path))
+    logger.info("Found %d files to translate into %s", len(files), args.target)
+
+    report = Report(report_path)
+    pipeline = FilePipeline(extract_text, translate_text, args.workers, args.translate_workers,
+                            extraction_cache=ExtractionCache(db_path=args.db))
+    try:
+        counts = run_batch(files, args.target, args.output_dir, report, pipeline, args.db,
+                           max(1, args.workers * IN_FLIGHT_PER_WORKER))
+    finally:
+        pipeline.shutdown()
+        report.close()
+        close_connections()
+    logger.info("Finished: %s", ', '.join(f"{count} {status}" for status, count in sorted(counts.items())) or "nothing to do")
+    return 1 if counts.get('failed') or counts.get('partial') else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,248 @@
+import argparse
+import json
+import math
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import fixtures
+from core import translation
+from core.extraction import extract_text, extract_pdf, preprocess_image, extraction_settings, analyze_image, prepare_image, run_ocr
+from core.history import save_to_history
+from core.translation_cache import TranslationCache
+from core.translator_client import FakeBackend, TokenBucket, TranslatorClient, set_client
+
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+# The fixed OCR chain the adaptive stage is compared with: grayscale and contrast at full resolution
+FIXED_STEPS = ['grayscale', 'contrast']
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    # Nearest-rank percentile
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+# Collects (format, stage) samples: seconds, units processed (files, pages, chars) and peak memory
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.units = {}
+        self.unit_names = {}
+        self.peaks = {}
+        self.errors = {}
+        self.details = {}
+
+    # Times fn(*args); units is a count or a function of the return value, in `unit`s
+    def measure(self, fmt, stage, fn, *args, units=1, unit='files', memory=False):
+        if memory:
+            tracemalloc.reset_peak()
+        began = time.perf_counter()
+        try:
+            value = fn(*args)
+        except Exception as e:
+            self.errors.setdefault(fmt, {})[stage] = f"{type(e).__name__}: {e}"
+            return None
+        elapsed = time.perf_counter() - began
+        key = (fmt, stage)
+        if memory:
+            self.peaks[key] = max(self.peaks.get(key, 0), tracemalloc.get_traced_memory()[1])
+        else:
+            self.add(fmt, stage, elapsed, units(value) if callable(units) else units, unit)
+        return value
+
+    def add(self, fmt, stage, seconds, units=1, unit='files'):
+        self.samples.setdefault((fmt, stage), []).append(seconds)
+        self.units[(fmt, stage)] = self.units.get((fmt, stage), 0) + units
+        self.unit_names[(fmt, stage)] = unit
+
+    def summary(self):
+        stages = {}
+        for (fmt, stage), seconds in sorted(self.samples.items()):
+            total = sum(seconds)
+            stages.setdefault(fmt, {})[stage] = {
+                'count': len(seconds),
+                'p50_ms': round(percentile(seconds, 50) * 1000, 3),
+                'p95_ms': round(percentile(seconds, 95) * 1000, 3),
+                'mean_ms': round(total / len(seconds) * 1000, 3),
+                'total_s': round(total, 4),
+                'unit': self.unit_names[(fmt, stage)],
+                'units': self.units[(fmt, stage)],
+                'units_per_s': round(self.units[(fmt, stage)] / total, 2) if total else None,
+                'peak_memory_kb': round(self.peaks[(fmt, stage)] / 1024, 1) if (fmt, stage) in self.peaks else None,
+            }
+        return stages
+
+
+# Function to measure and prepare an image the way adaptive OCR does; returns (image, plan)
+def prepare_adaptive(path):
+    from PIL import Image
+    with Image.open(path) as img:
+        img.load()
+        plan = analyze_image(img)
+        return (None if plan['blank'] else prepare_image(img, plan)), plan
+
+
+# Function to time the fixed and the adaptive OCR stages on one image
+def run_ocr_stages(recorder, fmt, path, memory=False):
+    image = recorder.measure(fmt, 'preprocess', preprocess_image, path, FIXED_STEPS, memory=memory)
+    if image is not None:
+        import pytesseract
+        recorder.measure(fmt, 'ocr', pytesseract.image_to_string, image, memory=memory)
+
+    prepared = recorder.measure(fmt, 'preprocess_adaptive', prepare_adaptive, path, memory=memory)
+    if prepared is None:
+        return
+    image, plan = prepared
+    detail = {'plan': plan, 'skipped': image is None}
+    if image is not None:
+        ocr = recorder.measure(fmt, 'ocr_adaptive', run_ocr, image, plan, memory=memory)
+        if ocr is not None:
+            words = ocr[1]
+            detail['words'] = len(words)
+            detail['mean_confidence'] = round(sum(c for _, c in words) / len(words), 1) if words else None
+    if not memory:
+        recorder.details.setdefault(fmt, {})[os.path.basename(path)] = detail
+
+
+# Function to run every stage once for one fixture file
+def run_file(recorder, fmt, path, target_language, cache, db_path, memory=False):
+    if fmt == 'png':
+        run_ocr_stages(recorder, fmt, path, memory)
+    elif fmt == 'pdf':
+        # Single process, so per-page costs are not hidden behind the worker pool
+        result = recorder.measure(fmt, 'pdf_pages', extract_pdf, path, 1, memory=memory,
+                                   units=lambda r: len(r[1]), unit='pages')
+        if result is not None and not memory:
+            for _, method, seconds in result[1]:
+                recorder.add(fmt, f'pdf_page_{method}', seconds, unit='pages')
+
+    text = recorder.measure(fmt, 'extract', extract_text, path, memory=memory)
+    if text is None:
+        return
+    if text.startswith(("Error", "No text found")):
+        # extract_text reports failures as text; don't time translating the message
+        recorder.errors.setdefault(fmt, {})['extract'] = text
+        return
+    translated = recorder.measure(fmt, 'translate', translation.translate_text, text, target_language, cache,
+                                  memory=memory, units=len(text), unit='chars')
+    if translated is None:
+        return
+    recorder.measure(fmt, 'persist', save_to_history, os.path.basename(path), text, translated[0], translated[1],
+                     target_language, db_path, memory=memory)
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return commit + ('-dirty' if dirty else '')
+
+
+# Function to print p50 changes against a previous results file
+def compare(results, baseline_path):
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    print(f"\nCompared with {baseline.get('commit')} ({baseline_path}):")
+    for fmt, stages in results['stages'].items():
+        for stage, current in stages.items():
+            previous = baseline.get('stages', {}).get(fmt, {}).get(stage)
+            if not previous or not previous['p50_ms']:
+                continue
+            change = (current['p50_ms'] - previous['p50_ms']) / previous['p50_ms'] * 100
+            print(f"  {fmt:5s} {stage:15s} p50 {previous['p50_ms']:10.2f} -> {current['p50_ms']:10.2f} ms ({change:+.1f}%)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark extract -> translate -> persist on a generated corpus.")
+    parser.add_argument('-r', '--repeat', type=int, default=3, help="Timed passes over the corpus")
+    parser.add_argument('-f', '--formats', nargs='*', choices=list(fixtures.CORPUS), help="Limit to these formats")
+    parser.add_argument('-t', '--target', default='fr')
+    parser.add_argument('--latency', type=float, default=0.0, help="Simulated backend latency per request (seconds)")
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--no-memory', action='store_true', help="Skip the tracemalloc pass")
+    parser.add_argument('-o', '--output', help="Results JSON path (default: benchmarks/results/<time>-<commit>.json)")
+    parser.add_argument('--compare', help="Previous results JSON to compare p50 latencies with")
+    args = parser.parse_args(argv)
+
+    scratch = tempfile.mkdtemp(prefix='bench-')
+    corpus, skipped = fixtures.generate(os.path.join(scratch, 'corpus'), args.formats, args.seed)
+    set_client(TranslatorClient(FakeBackend(latency=args.latency), rate_limiter=TokenBucket(rate=0)))
+    recorder = Recorder()
+
+    started = time.time()
+    for _ in range(args.repeat):
+        # Fresh database per pass: translation cache misses and history inserts are part of the cost
+        db_path = os.path.join(scratch, f'bench-{time.monotonic_ns()}.db')
+        cache = TranslationCache(db_path=db_path)
+        for fmt, paths in corpus.items():
+            for path in paths:
+                run_file(recorder, fmt, path, args.target, cache, db_path)
+
+    # Separate pass for peak memory, as tracemalloc slows Python-heavy stages down.
+    # It only sees Python allocations; Tesseract runs in its own process.
+    if not args.no_memory:
+        tracemalloc.start()
+        db_path = os.path.join(scratch, 'bench-memory.db')
+        cache = TranslationCache(db_path=db_path)
+        for fmt, paths in corpus.items():
+            for path in paths:
+                run_file(recorder, fmt, path, args.target, cache, db_path, memory=True)
+        tracemalloc.stop()
+
+    results = {
+        'commit': git_commit(),
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(started)),
+        'duration_s': round(time.time() - started, 2),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'settings': {'repeat': args.repeat, 'target': args.target, 'latency': args.latency, 'seed': args.seed,
+                     'extraction': {fmt: extraction_settings(paths[0]) for fmt, paths in corpus.items()}},
+        'corpus': {fmt: {'files': len(paths), 'bytes': sum(os.path.getsize(p) for p in paths)} for fmt, paths in corpus.items()},
+        'skipped_fixtures': skipped,
+        'stages': recorder.summary(),
+        'errors': recorder.errors,
+        # Adaptive OCR plan and word confidences per image
+        'ocr': recorder.details,
+        # ru_maxrss is KiB on Linux
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(started))}-{results['commit']}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+
+    for fmt, stages in results['stages'].items():
+        for stage, s in stages.items():
+            peak = f"  peak {s['peak_memory_kb']:.0f} KiB" if s['peak_memory_kb'] is not None else ''
+            print(f"{fmt:5s} {stage:15s} n={s['count']:<4d} p50 {s['p50_ms']:10.2f} ms  p95 {s['p95_ms']:10.2f} ms  {s['units_per_s']} {s['unit']}/s{peak}")
+    for fmt, stages in results['stages'].items():
+        # Whole-corpus time of the fixed OCR chain against the adaptive one
+        fixed = [stages[stage]['total_s'] for stage in ('preprocess', 'ocr') if stage in stages]
+        adaptive = [stages[stage]['total_s'] for stage in ('preprocess_adaptive', 'ocr_adaptive') if stage in stages]
+        if len(fixed) == 2 and adaptive and sum(adaptive):
+            print(f"{fmt:5s} OCR fixed {sum(fixed):.2f}s vs adaptive {sum(adaptive):.2f}s ({sum(fixed) / sum(adaptive):.2f}x)")
+    for fmt, errors in results['errors'].items():
+        for stage, error in errors.items():
+            print(f"{fmt:5s} {stage:15s} failed: {error}")
+    print(f"Results written to {output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
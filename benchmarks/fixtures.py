@@ -0,0 +1,151 @@
+import io
+import os
+import random
+import zlib
+
+# Deterministic filler text; the same seed always produces the same corpus
+WORDS = ('the quick brown fox jumps over lazy dog translation document scanned page report '
+         'invoice contract summary section paragraph analysis table figure result method data '
+         'customer order delivery payment account address meeting schedule project review').split()
+
+
+def words(rng, count):
+    return ' '.join(rng.choice(WORDS) for _ in range(count))
+
+
+def lines(rng, count, width=12):
+    return [words(rng, width).capitalize() + '.' for _ in range(count)]
+
+
+# Function to render lines of text into a white grayscale "scan" (PIL image).
+# shading darkens the background from left to right, like uneven lighting on a photo.
+def render_scan(rng, text_lines, size=(1700, 2200), rotate=0.0, noise=0.0, font_size=28, shading=0):
+    from PIL import Image, ImageDraw, ImageFont
+    try:
+        font = ImageFont.load_default(size=font_size)
+    except TypeError:
+        font = ImageFont.load_default()
+    img = Image.new('L', size, 255)
+    if shading:
+        img = Image.linear_gradient('L').rotate(90).resize(size).point(lambda p: 255 - shading * p // 255)
+    draw = ImageDraw.Draw(img)
+    margin, step = font_size * 30 // 7, font_size * 11 // 7
+    y = margin
+    for line in text_lines:
+        draw.text((margin, y), line, fill=0, font=font)
+        y += step
+        if y > size[1] - margin:
+            break
+    if noise:
+        pixels = img.load()
+        for _ in range(int(size[0] * size[1] * noise)):
+            pixels[rng.randrange(size[0]), rng.randrange(size[1])] = rng.randrange(256)
+    if rotate:
+        img = img.rotate(rotate, fillcolor=255, expand=False)
+    return img
+
+
+def write_png(path, rng, line_count=40, rotate=1.5, noise=0.002, **kwargs):
+    render_scan(rng, lines(rng, line_count), rotate=rotate, noise=noise, **kwargs).save(path, format='PNG')
+
+
+def _pdf_string(text):
+    return '(' + text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)') + ')'
+
+
+# Function to write a minimal multi-page PDF without a PDF library. Each page is
+# either text (a real text layer) or scan (a grayscale image only, forcing OCR).
+def write_pdf(path, rng, page_kinds, lines_per_page=45):
+    objects = {}
+    font_id, pages_id = 3, 2
+    objects[font_id] = b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>'
+    page_ids = []
+    next_id = 4
+    for kind in page_kinds:
+        page_id, content_id = next_id, next_id + 1
+        next_id += 2
+        page_lines = lines(rng, lines_per_page)
+        resources = f'/Font << /F1 {font_id} 0 R >>'
+        if kind == 'scan':
+            image_id = next_id
+            next_id += 1
+            img = render_scan(rng, page_lines, size=(1275, 1650))
+            data = zlib.compress(img.tobytes())
+            objects[image_id] = (f'<< /Type /XObject /Subtype /Image /Width {img.width} /Height {img.height} '
+                                 f'/ColorSpace /DeviceGray /BitsPerComponent 8 /Filter /FlateDecode /Length {len(data)} >>\nstream\n'
+                                 ).encode('latin-1') + data + b'\nendstream'
+            resources += f' /XObject << /Im1 {image_id} 0 R >>'
+            content = b'q 612 0 0 792 0 0 cm /Im1 Do Q'
+        else:
+            body = ' T* '.join(f'{_pdf_string(line)} Tj' for line in page_lines)
+            content = f'BT /F1 10 Tf 14 TL 50 750 Td {body} ET'.encode('latin-1')
+        objects[content_id] = f'<< /Length {len(content)} >>\nstream\n'.encode('latin-1') + content + b'\nendstream'
+        objects[page_id] = (f'<< /Type /Page /Parent {pages_id} 0 R /MediaBox [0 0 612 792] '
+                            f'/Resources << {resources} >> /Contents {content_id} 0 R >>').encode('latin-1')
+        page_ids.append(page_id)
+    objects[1] = f'<< /Type /Catalog /Pages {pages_id} 0 R >>'.encode('latin-1')
+    kids = ' '.join(f'{page_id} 0 R' for page_id in page_ids)
+    objects[pages_id] = f'<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>'.encode('latin-1')
+
+    out = io.BytesIO()
+    out.write(b'%PDF-1.4\n')
+    offsets = {}
+    for number in sorted(objects):
+        offsets[number] = out.tell()
+        out.write(f'{number} 0 obj\n'.encode('latin-1') + objects[number] + b'\nendobj\n')
+    xref = out.tell()
+    count = max(objects) + 1
+    out.write(f'xref\n0 {count}\n0000000000 65535 f \n'.encode('latin-1'))
+    for number in range(1, count):
+        out.write(f'{offsets[number]:010d} 00000 n \n'.encode('latin-1'))
+    out.write(f'trailer\n<< /Size {count} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode('latin-1'))
+    with open(path, 'wb') as f:
+        f.write(out.getvalue())
+
+
+def write_docx(path, rng, paragraphs=400):
+    from docx import Document
+    doc = Document()
+    for _ in range(paragraphs):
+        doc.add_paragraph(words(rng, rng.randint(20, 60)).capitalize() + '.')
+    doc.save(path)
+
+
+def write_txt(path, rng, paragraphs=800):
+    with open(path, 'w', encoding='utf-8') as f:
+        for _ in range(paragraphs):
+            f.write(words(rng, rng.randint(20, 60)).capitalize() + '.\n\n')
+
+
+# Corpus definitions: format -> list of (file name, writer, keyword arguments)
+CORPUS = {
+    'png': [(f'scan_{i}.png', write_png, {}) for i in range(3)] + [
+        # Phone photo: 12 MP, large text, uneven lighting
+        ('photo.png', write_png, {'size': (4032, 3024), 'line_count': 14, 'font_size': 90, 'rotate': 0.5, 'noise': 0.0, 'shading': 110}),
+        ('blank.png', write_png, {'line_count': 0}),
+    ],
+    'pdf': [('text_12p.pdf', write_pdf, {'page_kinds': ['text'] * 12}),
+            ('mixed_6p.pdf', write_pdf, {'page_kinds': ['text', 'scan'] * 3})],
+    'docx': [('large.docx', write_docx, {})],
+    'txt': [('large.txt', write_txt, {})],
+}
+
+
+# Function to generate the corpus into directory; returns {format: [path, ...]}.
+# Files whose generator library is missing are skipped, with the reason in `skipped`.
+def generate(directory, formats=None, seed=1234):
+    os.makedirs(directory, exist_ok=True)
+    corpus, skipped = {}, {}
+    for fmt, files in CORPUS.items():
+        if formats and fmt not in formats:
+            continue
+        rng = random.Random(f'{seed}-{fmt}')
+        for name, writer, kwargs in files:
+            path = os.path.join(directory, name)
+            try:
+                writer(path, rng, **kwargs)
+            except ImportError as e:
+                skipped[name] = str(e)
+                continue
+            corpus.setdefault(fmt, []).append(path)
+    return corpus, skipped
@@ -0,0 +1,79 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules whose import cost we want off the startup path
+HEAVY_MODULES = ['pytesseract', 'pdfplumber', 'docx', 'PIL', 'googletrans', 'httpx', 'streamlit', 'flask']
+
+# Entry points to time: name -> statement run in a fresh interpreter
+TARGETS = {
+    'core': 'import core.extraction, core.translation, core.history, core.pipeline',
+    'flask': 'import app',
+    'batch': 'import batch_translate',
+    # Runs the Streamlit script body in bare mode, as one rerun would
+    'streamlit': 'import streamlit_app',
+}
+
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'seconds': elapsed, 'loaded': [m for m in {heavy!r} if m in sys.modules]}}))
+'''
+
+
+# Function to time one statement in a fresh interpreter; returns (seconds, loaded heavy modules)
+def measure(statement, env):
+    code = PROBE.format(statement=statement, heavy=HEAVY_MODULES)
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "probe failed")
+    data = json.loads(result.stdout.strip().splitlines()[-1])
+    return data['seconds'], data['loaded']
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold import time of the front ends.")
+    parser.add_argument('-n', '--runs', type=int, default=5)
+    parser.add_argument('targets', nargs='*', default=list(TARGETS))
+    parser.add_argument('--json', action='store_true', help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    # Keep the probes away from the real history database
+    scratch = tempfile.mkdtemp(prefix='startup-bench-')
+    env = dict(os.environ, TRANSLATIONS_DB=os.path.join(scratch, 'translations.db'))
+    results = {}
+    for name in args.targets:
+        try:
+            runs = [measure(TARGETS[name], env) for _ in range(args.runs)]
+        except RuntimeError as e:
+            results[name] = {'error': str(e)}
+            continue
+        seconds = [s for s, _ in runs]
+        results[name] = {
+            'median_ms': round(statistics.median(seconds) * 1000, 1),
+            'min_ms': round(min(seconds) * 1000, 1),
+            'max_ms': round(max(seconds) * 1000, 1),
+            'heavy_modules_loaded': runs[-1][1],
+        }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for name, result in results.items():
+        if 'error' in result:
+            print(f"{name:10s} failed: {result['error']}")
+        else:
+            print(f"{name:10s} median {result['median_ms']:8.1f} ms  (min {result['min_ms']:.1f}, max {result['max_ms']:.1f})"
+                  f"  heavy modules: {', '.join(result['heavy_modules_loaded']) or 'none'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1 @@
+# Lets the tests import the core package from the repository root
@@ -0,0 +1,130 @@
+import io
+from .segmentation import translate_texts
+
+# Run children that only carry text; runs holding anything else (images, fields,
+# footnote references) are left untouched and never merged
+_TEXT_TAGS = ('rPr', 't', 'tab', 'br', 'cr', 'noBreakHyphen', 'softHyphen', 'lastRenderedPageBreak')
+
+# Formats that can be written back with their layout (python-docx cannot open legacy .doc)
+ROUND_TRIP_EXTENSIONS = ('.docx',)
+
+# python-docx is imported inside the functions that need it, like the extractors
+
+
+def supports_round_trip(filename):
+    return filename.lower().endswith(ROUND_TRIP_EXTENSIONS)
+
+
+def _qn(tag):
+    from docx.oxml.ns import qn
+    return qn(f'w:{tag}')
+
+
+def _is_text_run(run):
+    text_tags = {_qn(tag) for tag in _TEXT_TAGS}
+    return all(child.tag in text_tags for child in run._r)
+
+
+def _run_format(run):
+    rpr = run._r.rPr
+    return rpr.xml if rpr is not None else ''
+
+
+# Function to walk a block container (body, cell, header) yielding its paragraphs in order,
+# descending into tables. Merged cells appear once; seen maps id() to the element,
+# keeping the lxml proxies alive so their ids stay unique.
+def _iter_block_paragraphs(container, seen):
+    from docx.table import Table
+    for block in container.iter_inner_content():
+        if isinstance(block, Table):
+            for row in block.rows:
+                for cell in row.cells:
+                    if id(cell._tc) in seen:
+                        continue
+                    seen[id(cell._tc)] = cell._tc
+                    yield from _iter_block_paragraphs(cell, seen)
+        else:
+            yield block
+
+
+# Function to list every paragraph of a document: body and tables in document order,
+# then each distinct header and footer
+def iter_docx_paragraphs(doc):
+    seen = {}
+    yield from _iter_block_paragraphs(doc, seen)
+    for section in doc.sections:
+        for part in (section.first_page_header, section.header, section.even_page_header,
+                     section.first_page_footer, section.footer, section.even_page_footer):
+            if part.is_linked_to_previous or id(part._element) in seen:
+                continue
+            seen[id(part._element)] = part._element
+            yield from _iter_block_paragraphs(part, seen)
+
+
+# Function to extract the text of a DOCX including tables, headers and footers
+def docx_text(source):
+    from docx import Document
+    doc = Document(source)
+    return '\n'.join(paragraph.text for paragraph in iter_docx_paragraphs(doc) if paragraph.text.strip())
+
+
+# Function to group a paragraph's text runs into translation units. Adjacent runs with the
+# same formatting are merged first (Word often splits runs for revision ids or spell
+# checking), so a uniformly formatted paragraph becomes a single unit.
+def _paragraph_units(paragraph):
+    from docx.text.hyperlink import Hyperlink
+    groups = [[]]
+    for item in paragraph.iter_inner_content():
+        if isinstance(item, Hyperlink):
+            groups.append(list(item.runs))
+            groups.append([])
+        else:
+            groups[-1].append(item)
+
+    units = []
+    for runs in groups:
+        previous = None
+        for run in runs:
+            if not _is_text_run(run):
+                previous = None
+                continue
+            if previous is not None and _run_format(previous) == _run_format(run):
+                previous.text = previous.text + run.text
+                run._r.getparent().remove(run._r)
+                continue
+            units.append(run)
+            previous = run
+    return units
+
+
+# Function to translate a DOCX in place of its runs and return (docx_bytes, detected_language, stats).
+# source is a path, bytes or a file-like object; the original is never modified. Every
+# run text is collected first so duplicates are translated once and the backend sees
+# a minimal number of batches.
+def translate_docx(source, target_language, translate_batch, cache=None):
+    from docx import Document
+    doc = Document(io.BytesIO(source) if isinstance(source, (bytes, bytearray, memoryview)) else source)
+
+    runs = [run for paragraph in iter_docx_paragraphs(doc) for run in _paragraph_units(paragraph)]
+    # Keep surrounding whitespace out of the request so spacing between runs survives
+    units = {}
+    for run in runs:
+        core = run.text.strip()
+        if core and any(char.isalpha() for char in core):
+            units.setdefault(core, []).append(run)
+
+    texts = list(units)
+    translated = translate_texts(texts, target_language, translate_batch, cache)
+    weights = {}
+    for text, (translated_text, language) in zip(texts, translated):
+        weights[language] = weights.get(language, 0) + len(text) * len(units[text])
+        for run in units[text]:
+            leading = run.text[:len(run.text) - len(run.text.lstrip())]
+            trailing = run.text[len(run.text.rstrip()):]
+            run.text = leading + translated_text + trailing
+
+    output = io.BytesIO()
+    doc.save(output)
+    detected_language = max(weights, key=weights.get) if weights else "Unknown"
+    stats = {'runs': len(runs), 'units': sum(len(r) for r in units.values()), 'unique_units': len(texts)}
+    return output.getvalue(), detected_language, stats
@@ -0,0 +1,497 @@
+import os
+import io
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from . import metrics
+from .documents import docx_text
+
+logger = logging.getLogger(__name__)
+
+# Format libraries (Pillow, pytesseract, pdfplumber, python-docx) are imported inside
+# the functions that use them, so a format's library only loads when it is first needed
+
+# PDF extraction settings: pages are split into ranges of PDF_PAGES_PER_TASK and
+# spread over up to PDF_WORKERS processes; pages without a text layer are OCR'd
+PDF_WORKERS = int(os.environ.get('PDF_WORKERS', min(4, os.cpu_count() or 1)))
+PDF_PAGES_PER_TASK = int(os.environ.get('PDF_PAGES_PER_TASK', 8))
+PDF_OCR_RESOLUTION = int(os.environ.get('PDF_OCR_RESOLUTION', 300))
+
+# Image preprocessing chain applied before OCR, as a comma-separated list of step names.
+# Available steps: grayscale, contrast, downscale, binarize, deskew
+IMAGE_PREPROCESS_STEPS = os.environ.get('IMAGE_PREPROCESS_STEPS', 'grayscale,contrast').split(',')
+IMAGE_CONTRAST = float(os.environ.get('IMAGE_CONTRAST', 2.0))
+IMAGE_MAX_SIDE = int(os.environ.get('IMAGE_MAX_SIDE', 3500))
+DESKEW_MAX_ANGLE = float(os.environ.get('DESKEW_MAX_ANGLE', 5.0))
+
+# OCR mode: 'adaptive' measures each image on a small copy first and picks its scale,
+# binarization and Tesseract page segmentation mode, skipping images without text;
+# 'fixed' applies the IMAGE_PREPROCESS_STEPS chain at full resolution
+OCR_MODE = os.environ.get('OCR_MODE', 'adaptive')
+# Images are rescaled so a line of text is about this many pixels high; when no lines
+# are found, images above OCR_TARGET_DPI (from their metadata) are scaled down to it
+OCR_TARGET_LINE_HEIGHT = int(os.environ.get('OCR_TARGET_LINE_HEIGHT', 32))
+OCR_TARGET_DPI = int(os.environ.get('OCR_TARGET_DPI', 300))
+OCR_MAX_UPSCALE = float(os.environ.get('OCR_MAX_UPSCALE', 2.0))
+# Tesseract page segmentation mode: 'auto' picks one per image, or a --psm number
+OCR_PSM = os.environ.get('OCR_PSM', 'auto')
+# Images whose ink is fainter than this (difference of the Otsu class means, measured on
+# the reduced copy) or covers less than OCR_MIN_INK of the image are treated as blank.
+# The default only rejects scanner noise; faded print and pencil (gray 95 on 150) still get OCR.
+OCR_MIN_CONTRAST = int(os.environ.get('OCR_MIN_CONTRAST', 20))
+OCR_MIN_INK = float(os.environ.get('OCR_MIN_INK', 0.0002))
+# Words Tesseract is less confident about than this (0-100) are counted as low confidence
+OCR_LOW_CONFIDENCE = int(os.environ.get('OCR_LOW_CONFIDENCE', 60))
+# Longest side of the copy images are measured on
+OCR_ANALYSIS_SIDE = 1200
+
+def _grayscale(img):
+    return img.convert('L')
+
+def _contrast(img):
+    from PIL import ImageEnhance
+    return ImageEnhance.Contrast(img).enhance(IMAGE_CONTRAST)
+
+def _downscale(img):
+    from PIL import Image
+    if max(img.size) > IMAGE_MAX_SIDE:
+        img = img.copy()
+        img.thumbnail((IMAGE_MAX_SIDE, IMAGE_MAX_SIDE), Image.LANCZOS)
+    return img
+
+# Function to pick a global threshold from the grayscale histogram (Otsu's method)
+def otsu_threshold(img):
+    return _otsu(img.convert('L').histogram())
+
+def _otsu(histogram):
+    total = sum(histogram)
+    weighted_total = sum(i * count for i, count in enumerate(histogram))
+    background, weighted_background = 0, 0
+    best_threshold, best_variance = 127, -1.0
+    for i, count in enumerate(histogram):
+        background += count
+        if background == 0:
+            continue
+        foreground = total - background
+        if foreground == 0:
+            break
+        weighted_background += i * count
+        mean_background = weighted_background / background
+        mean_foreground = (weighted_total - weighted_background) / foreground
+        variance = background * foreground * (mean_background - mean_foreground) ** 2
+        if variance > best_variance:
+            best_threshold, best_variance = i, variance
+    return best_threshold
+
+def _binarize(img):
+    threshold = otsu_threshold(img)
+    return img.convert('L').point(lambda p: 255 if p > threshold else 0)
+
+# Function to straighten slightly rotated scans: the angle whose horizontal
+# projection profile has the highest variance puts text lines on rows
+def _deskew(img):
+    from PIL import Image
+    gray = img.convert('L')
+    sample = gray.copy()
+    sample.thumbnail((800, 800))
+    threshold = otsu_threshold(sample)
+    sample = sample.point(lambda p: 0 if p > threshold else 255)
+    best_angle, best_score = 0.0, -1.0
+    steps = int(DESKEW_MAX_ANGLE * 4)
+    for step in range(-steps, steps + 1):
+        angle = step / 4
+        rows = list(sample.rotate(angle, resample=Image.BILINEAR).resize((1, sample.height), Image.BOX).getdata())
+        mean = sum(rows) / len(rows)
+        score = sum((value - mean) ** 2 for value in rows)
+        if score > best_score:
+            best_angle, best_score = angle, score
+    if best_angle == 0:
+        return img
+    return gray.rotate(best_angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+
+PREPROCESS_STEPS = {
+    'grayscale': _grayscale,
+    'contrast': _contrast,
+    'downscale': _downscale,
+    'binarize': _binarize,
+    'deskew': _deskew,
+}
+
+# Function to open an image for OCR; source may be bytes, a file-like object, a path or a PIL image
+def _open_image(source):
+    from PIL import Image
+    if isinstance(source, Image.Image):
+        return source
+    img = Image.open(io.BytesIO(source) if isinstance(source, (bytes, bytearray, memoryview)) else source)
+    img.load()
+    return img
+
+# Function to preprocess an image in memory; source may be bytes, a file-like object, a path or a PIL image
+def preprocess_image(source, steps=None):
+    img = _open_image(source)
+    for name in steps if steps is not None else IMAGE_PREPROCESS_STEPS:
+        name = name.strip()
+        if not name:
+            continue
+        try:
+            img = PREPROCESS_STEPS[name](img)
+        except Exception as e:
+            logger.warning("Skipping image preprocessing step %s: %s", name, e)
+    return img
+
+# Function to find text lines in a binary ink mask (ink = 255); returns one list of line
+# heights (pixels) per vertical strip. Strips keep slightly skewed lines apart.
+def _line_heights(mask, strips=4):
+    from PIL import Image
+    width = mask.width // strips
+    if width < 50:
+        strips, width = 1, mask.width
+    found = []
+    for i in range(strips):
+        rows = list(mask.crop((i * width, 0, (i + 1) * width, mask.height)).resize((1, mask.height), Image.BOX).getdata())
+        heights = []
+        run = 0
+        # A row holds text when at least 1% of its pixels are ink
+        for value in rows + [0]:
+            if value > 2:
+                run += 1
+            else:
+                if run >= 2:
+                    heights.append(run)
+                run = 0
+        found.append(heights)
+    return found
+
+# Function to measure an image for adaptive OCR on a small copy; returns a plan dict with
+# blank, inverted, scale, binarization and psm, plus the measured contrast and ink share.
+# A blank plan says why in skip_reason. The histogram decides the binarization:
+# near-bilevel images are left alone, clearly bimodal ones get a global Otsu threshold
+# and the rest (uneven lighting, photos) a local threshold.
+def analyze_image(img):
+    from PIL import Image
+    gray = img.convert('L')
+    factor = min(1.0, OCR_ANALYSIS_SIDE / max(gray.size))
+    sample = gray.resize((max(1, round(gray.width * factor)), max(1, round(gray.height * factor))), Image.BOX) if factor < 1 else gray
+
+    histogram = sample.histogram()
+    total = sample.width * sample.height
+    threshold = _otsu(histogram)
+    dark = sum(histogram[:threshold + 1])
+    light = total - dark
+    plan = {'blank': True, 'skip_reason': 'uniform', 'inverted': False, 'scale': 1.0, 'binarization': 'none', 'psm': None,
+            'lines': 0, 'contrast': 0.0, 'ink': 0.0}
+    if dark == 0 or light == 0:
+        return plan
+    mean_dark = sum(i * count for i, count in enumerate(histogram[:threshold + 1])) / dark
+    mean_light = sum(i * count for i, count in enumerate(histogram[threshold + 1:], threshold + 1)) / light
+    # Text is the minority class: more dark than light pixels means light text on a dark background
+    plan['inverted'] = dark > light
+    ink = (light if plan['inverted'] else dark) / total
+    plan['contrast'] = round(mean_light - mean_dark, 1)
+    plan['ink'] = round(ink, 5)
+    if plan['contrast'] < OCR_MIN_CONTRAST:
+        plan['skip_reason'] = 'low_contrast'
+        return plan
+    if ink < OCR_MIN_INK:
+        plan['skip_reason'] = 'no_ink'
+        return plan
+
+    mask = sample.point(lambda p: 255 if (p > threshold) == plan['inverted'] else 0)
+    strips = _line_heights(mask)
+    heights = sorted(height for strip in strips for height in strip)
+    if not heights:
+        plan['skip_reason'] = 'no_lines'
+        return plan
+    plan['blank'] = False
+    plan['skip_reason'] = None
+    plan['lines'] = max(len(strip) for strip in strips)
+
+    line_height = heights[len(heights) // 2] / factor
+    scale = OCR_TARGET_LINE_HEIGHT / line_height
+    # Several "lines" yet one over a third of the image: pictures or merged blocks, not text lines
+    if plan['lines'] > 1 and line_height > gray.height / 3:
+        dpi = img.info.get('dpi', (0, 0))[0]
+        scale = OCR_TARGET_DPI / dpi if dpi and dpi > OCR_TARGET_DPI else 1.0
+    # Leave images that are close to the target alone; resampling costs time and sharpness
+    if 0.75 <= scale <= 1.5:
+        scale = 1.0
+    scale = min(scale, OCR_MAX_UPSCALE)
+    # IMAGE_MAX_SIDE only limits how far an image is enlarged: shrinking a large scan to fit
+    # would take its text below the target height, so text that is already small keeps its
+    # size and large text is never reduced past the target
+    scale = max(min(scale, 1.0), min(scale, IMAGE_MAX_SIDE / max(gray.size)))
+    plan['scale'] = round(scale, 3)
+
+    extremes = sum(histogram[:32]) + sum(histogram[224:])
+    variance = sum(count * (i - (mean_dark * dark + mean_light * light) / total) ** 2 for i, count in enumerate(histogram)) / total
+    separability = dark * light / total ** 2 * (mean_light - mean_dark) ** 2 / variance if variance else 1.0
+    if extremes / total > 0.95:
+        plan['binarization'] = 'none'
+    elif separability >= 0.8:
+        plan['binarization'] = 'otsu'
+    else:
+        plan['binarization'] = 'adaptive'
+
+    # Page segmentation: a single line, scattered text (labels, photos) or a page of text
+    coverage = sum(heights) / (len(strips) * sample.height)
+    if OCR_PSM != 'auto':
+        plan['psm'] = int(OCR_PSM)
+    elif plan['lines'] == 1 and sample.height < 4 * heights[-1]:
+        plan['psm'] = 7
+    elif coverage < 0.05:
+        plan['psm'] = 11
+    else:
+        plan['psm'] = 3
+    return plan
+
+# Function to apply an analyze_image plan: invert, rescale and binarize
+def prepare_image(img, plan):
+    from PIL import Image, ImageChops, ImageFilter, ImageOps
+    gray = img.convert('L')
+    if plan['inverted']:
+        gray = ImageOps.invert(gray)
+    if plan['scale'] != 1.0:
+        size = (max(1, round(gray.width * plan['scale'])), max(1, round(gray.height * plan['scale'])))
+        # reducing_gap shrinks large photos by an integer factor first, which is much faster
+        gray = gray.resize(size, Image.LANCZOS if plan['scale'] < 1 else Image.BICUBIC, reducing_gap=2.0)
+    if plan['binarization'] == 'otsu':
+        threshold = otsu_threshold(gray)
+        gray = gray.point(lambda p: 255 if p > threshold else 0)
+    elif plan['binarization'] == 'adaptive':
+        # Ink is what is clearly darker than its neighbourhood, so shadows and gradients drop out
+        background = gray.filter(ImageFilter.BoxBlur(OCR_TARGET_LINE_HEIGHT))
+        gray = ImageChops.subtract(background, gray).point(lambda p: 0 if p > 12 else 255)
+    return gray
+
+# Function to prepare an image for OCR in the configured mode; returns (image, plan),
+# with image None when the image is blank. Explicit steps always use the fixed chain.
+def prepare_ocr_image(source, steps=None):
+    img = _open_image(source)
+    if OCR_MODE != 'adaptive' or steps is not None:
+        plan = {'blank': False, 'scale': 1.0, 'binarization': 'steps', 'psm': int(OCR_PSM) if OCR_PSM != 'auto' else None}
+        return preprocess_image(img, steps), plan
+    plan = analyze_image(img)
+    if plan['blank']:
+        return None, plan
+    return prepare_image(img, plan), plan
+
+# Function to rebuild text from Tesseract's word boxes: words of a line joined by
+# spaces, lines by newlines and paragraphs by a blank line
+def _ocr_text(data):
+    lines = []
+    previous = None
+    for i, word in enumerate(data['text']):
+        if float(data['conf'][i]) < 0 or not word.strip():
+            continue
+        block = (data['block_num'][i], data['par_num'][i])
+        line = block + (data['line_num'][i],)
+        if previous is None or line != previous:
+            if previous is not None and block != previous[:2]:
+                lines.append('')
+            lines.append(word)
+        else:
+            lines[-1] += ' ' + word
+        previous = line
+    return '\n'.join(lines) + '\n' if lines else ''
+
+# Function to OCR a prepared image; returns (text, [(word, confidence), ...])
+def run_ocr(img, plan):
+    import pytesseract
+    # Set Tesseract path (uncomment if needed)
+    # pytesseract.pytesseract.tesseract_cmd = '/opt/homebrew/bin/tesseract'
+    config = f"--psm {plan['psm']}" if plan.get('psm') is not None else ''
+    # One Tesseract pass gives both the text and a confidence per word
+    data = pytesseract.image_to_data(img, config=config, output_type=pytesseract.Output.DICT)
+    words = [(word, float(conf)) for word, conf in zip(data['text'], data['conf']) if float(conf) >= 0 and word.strip()]
+    return _ocr_text(data), words
+
+# Function to OCR an image held in memory; returns a dict with text, words as
+# (word, confidence) pairs, mean_confidence and the preprocessing plan used
+def ocr_image(source, steps=None):
+    with metrics.timed('ocr_prepare'):
+        img, plan = prepare_ocr_image(source, steps)
+    if img is None:
+        metrics.inc('ocr_images_total', result='blank')
+        logger.debug("OCR skipped a blank image (%s): %s", plan['skip_reason'], plan)
+        return {'text': '', 'words': [], 'mean_confidence': None, 'plan': plan}
+    with metrics.timed('ocr', psm=plan['psm'] or 'default'):
+        text, words = run_ocr(img, plan)
+    metrics.inc('ocr_images_total', result='ocr')
+    low = [word for word, confidence in words if confidence < OCR_LOW_CONFIDENCE]
+    if words:
+        metrics.inc('ocr_words_total', len(words) - len(low), confidence='high')
+        metrics.inc('ocr_words_total', len(low), confidence='low')
+    mean_confidence = sum(confidence for _, confidence in words) / len(words) if words else None
+    logger.debug("OCR %s: %d words, mean confidence %s, %d low confidence %s", plan, len(words),
+                 f"{mean_confidence:.1f}" if mean_confidence is not None else '-', len(low), low[:20])
+    return {'text': text, 'words': words, 'mean_confidence': mean_confidence, 'plan': plan}
+
+# Function to OCR an image held in memory
+def extract_image_text(source, steps=None):
+    return ocr_image(source, steps)['text']
+
+# Function to wrap in-memory bytes so parsers can read them like a file
+def as_file(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    return source
+
+# Function to extract a range of PDF pages; returns (page_number, text, method, seconds) tuples.
+# source is a path or the PDF bytes. A page whose OCR fails is kept empty with method
+# 'ocr_failed', so the other pages survive.
+def extract_pdf_pages(source, start, stop, ocr_fallback=True):
+    import pdfplumber
+    pages = []
+    with pdfplumber.open(as_file(source)) as pdf:
+        for number in range(start, stop):
+            began = time.perf_counter()
+            page = pdf.pages[number]
+            page_text = page.extract_text() or ''
+            method = 'text'
+            if not page_text.strip() and ocr_fallback:
+                # Scanned page: render it and run it through the image OCR path
+                try:
+                    image = page.to_image(resolution=PDF_OCR_RESOLUTION).original
+                    page_text = extract_image_text(image)
+                    method = 'ocr'
+                except Exception as e:
+                    logger.warning("OCR failed on PDF page %d: %s", number + 1, e)
+                    page_text, method = '', 'ocr_failed'
+            page.close()
+            pages.append((number + 1, page_text, method, time.perf_counter() - began))
+    return pages
+
+# Function to extract a PDF with page ranges spread across worker processes.
+# Returns (text, timings) where timings lists (page_number, method, seconds) per page.
+def extract_pdf(source, workers=PDF_WORKERS, pages_per_task=PDF_PAGES_PER_TASK, ocr_fallback=True):
+    import pdfplumber
+    with pdfplumber.open(as_file(source)) as pdf:
+        page_count = len(pdf.pages)
+    starts = list(range(0, page_count, pages_per_task))
+    stops = [min(start + pages_per_task, page_count) for start in starts]
+
+    if workers <= 1 or len(starts) <= 1:
+        chunks = [extract_pdf_pages(source, start, stop, ocr_fallback) for start, stop in zip(starts, stops)]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(starts))) as pool:
+            captured = list(pool.map(metrics.run_captured, repeat(extract_pdf_pages), repeat(source), starts, stops, repeat(ocr_fallback)))
+        # OCR metrics recorded in the page workers are applied here, and from here reach
+        # the pipeline's parent process like any other extraction metric
+        chunks = []
+        for chunk, events in captured:
+            metrics.replay(events)
+            chunks.append(chunk)
+
+    pages = [page for chunk in chunks for page in chunk]
+    text = ''.join(page_text + '\n' for _, page_text, _, _ in pages if page_text)
+    timings = [(number, method, seconds) for number, _, method, seconds in pages]
+    return text, timings
+
+# Function to log per-page PDF timings, slowest pages first
+def log_pdf_timings(file_path, timings):
+    if not timings:
+        return
+    total = sum(seconds for _, _, seconds in timings)
+    ocr_pages = sum(1 for _, method, _ in timings if method == 'ocr')
+    failed_pages = sum(1 for _, method, _ in timings if method == 'ocr_failed')
+    logger.info("Extracted %s: %d pages (%d OCR, %d OCR failed) in %.2fs of page time", os.path.basename(file_path), len(timings),
+                ocr_pages, failed_pages, total)
+    for number, method, seconds in sorted(timings, key=lambda t: t[2], reverse=True)[:10]:
+        logger.info("  page %d [%s]: %.3fs", number, method, seconds)
+    logger.debug("Per-page timings for %s: %s", file_path, timings)
+
+# Extractor registry: file extension -> (function, label). An extractor takes the
+# file path and, for uploads held in memory, its bytes, and returns the raw text.
+EXTRACTORS = {}
+
+# Decorator to register an extractor for one or more extensions
+def register_extractor(extensions, label):
+    def decorator(fn):
+        for ext in extensions:
+            EXTRACTORS[ext.lower()] = (fn, label)
+        return fn
+    return decorator
+
+# Bump when extractor output changes for the same input and settings, so cached
+# extractions made by older code are not reused
+EXTRACTION_VERSION = 5
+
+# Start of the note put before the text of a PDF some of whose pages failed OCR
+OCR_FAILED_PREFIX = "[OCR failed on"
+
+# Function to describe every setting that affects the extracted text of a file type;
+# part of the extraction cache key
+def extraction_settings(file_path):
+    ext = os.path.splitext(file_path)[1].lower()
+    label = EXTRACTORS[ext][1] if ext in EXTRACTORS else 'unsupported'
+    settings = [f"v{EXTRACTION_VERSION}", label]
+    if label in ('image', 'PDF') and OCR_MODE == 'adaptive':
+        settings += ["ocr=adaptive", f"line_height={OCR_TARGET_LINE_HEIGHT}", f"dpi={OCR_TARGET_DPI}", f"max_upscale={OCR_MAX_UPSCALE}",
+                     f"psm={OCR_PSM}", f"min_contrast={OCR_MIN_CONTRAST}", f"min_ink={OCR_MIN_INK}", f"max_side={IMAGE_MAX_SIDE}"]
+    elif label in ('image', 'PDF'):
+        steps = ','.join(step.strip() for step in IMAGE_PREPROCESS_STEPS if step.strip())
+        settings += [f"steps={steps}", f"contrast={IMAGE_CONTRAST}", f"max_side={IMAGE_MAX_SIDE}", f"deskew={DESKEW_MAX_ANGLE}",
+                     f"psm={OCR_PSM}"]
+    if label == 'PDF':
+        settings.append(f"ocr_resolution={PDF_OCR_RESOLUTION}")
+    return '|'.join(settings)
+
+# Function to list the registered extensions, e.g. for upload filters
+def supported_extensions():
+    return tuple(EXTRACTORS)
+
+@register_extractor(('.jpg', '.jpeg', '.png'), 'image')
+def _extract_image(file_path, data=None):
+    return extract_image_text(data if data is not None else file_path)
+
+@register_extractor(('.pdf',), 'PDF')
+def _extract_pdf(file_path, data=None):
+    text, timings = extract_pdf(data if data is not None else file_path)
+    log_pdf_timings(file_path, timings)
+    for method in ('text', 'ocr', 'ocr_failed'):
+        pages = sum(1 for _, page_method, _ in timings if page_method == method)
+        if pages:
+            metrics.inc('pages_processed_total', pages, method=method)
+    failed = [number for number, method, _ in timings if method == 'ocr_failed']
+    if not failed:
+        return text
+    note = f"{OCR_FAILED_PREFIX} {len(failed)} of {len(timings)} pages: {', '.join(map(str, failed))}]"
+    # Nothing readable came back: report an error rather than "No text found"
+    if not text.strip():
+        raise RuntimeError(note.strip('[]'))
+    return f"{note}\n\n{text}"
+
+@register_extractor(('.doc', '.docx'), 'DOC')
+def _extract_docx(file_path, data=None):
+    return docx_text(as_file(data if data is not None else file_path))
+
+@register_extractor(('.txt',), 'TXT')
+def _extract_txt(file_path, data=None):
+    if data is not None:
+        return bytes(data).decode('utf-8')
+    with open(file_path, 'r', encoding='utf-8') as file:
+        return file.read()
+
+# Function to check whether extracted text is complete enough to cache: errors, "No text
+# found" and PDFs with pages that failed OCR are extracted again next time
+def is_complete_extraction(text):
+    return not text.startswith(("Error", "Unsupported file format", "No text found", OCR_FAILED_PREFIX))
+
+# Function to extract text from files. Uploads held in memory pass their bytes as
+# data (file_path then only supplies the name), so they never touch the filesystem.
+def extract_text(file_path, data=None):
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext not in EXTRACTORS:
+        return "Unsupported file format"
+    extractor, label = EXTRACTORS[ext]
+    fmt = metrics.file_format(file_path)
+    try:
+        metrics.inc('bytes_processed_total', len(data) if data is not None else os.path.getsize(file_path), format=fmt)
+        with metrics.timed('extract', format=fmt):
+            text = extractor(file_path, data)
+    except Exception as e:
+        metrics.inc('stage_errors_total', stage='extract', format=fmt)
+        return f"Error processing {label}: {str(e)}"
+    metrics.inc('characters_total', len(text), kind='extracted')
+    return text if text.strip() else f"No text found in {label}"
@@ -0,0 +1,85 @@
+import hashlib
+import os
+import threading
+import time
+from .storage import DB_PATH, transaction
+from .extraction import extraction_settings
+
+# Total size (bytes of extracted text) kept on disk before least recently used entries go
+MAX_BYTES = int(os.environ.get('EXTRACTION_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+# Function to hash a pipeline source: (filename, data) hashes the bytes, a path hashes the file
+def source_sha256(args):
+    digest = hashlib.sha256()
+    if len(args) > 1 and args[1] is not None:
+        digest.update(args[1])
+    else:
+        with open(args[0], 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Function to build the cache key from the content hash and the extractor settings
+def make_key(sha256, file_path):
+    return hashlib.sha256(f"{sha256}\0{extraction_settings(file_path)}".encode('utf-8')).hexdigest()
+
+
+# Extracted text keyed by file content and extraction settings, kept in SQLite and
+# trimmed to max_bytes by evicting the least recently used entries
+class ExtractionCache:
+    def __init__(self, db_path=DB_PATH, max_bytes=MAX_BYTES):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    # Returns the extracted text or None on a miss
+    def get(self, sha256, file_path):
+        key = make_key(sha256, file_path)
+        with transaction(self.db_path) as c:
+            c.execute('SELECT text FROM extraction_cache WHERE key = ?', (key,))
+            row = c.fetchone()
+            if row is not None:
+                c.execute('UPDATE extraction_cache SET accessed_at = ? WHERE key = ?', (time.time(), key))
+        self._count('misses' if row is None else 'hits')
+        return None if row is None else row[0]
+
+    def put(self, sha256, file_path, text):
+        key = make_key(sha256, file_path)
+        now = time.time()
+        with transaction(self.db_path) as c:
+            c.execute('''INSERT OR REPLACE INTO extraction_cache (key, text, size, created_at, accessed_at)
+                         VALUES (?, ?, ?, ?, ?)''',
+                      (key, text, len(text.encode('utf-8')), now, now))
+        self.prune()
+
+    # Function to evict least recently used entries beyond max_bytes
+    def prune(self):
+        if self.max_bytes is None:
+            return
+        with transaction(self.db_path) as c:
+            c.execute('''DELETE FROM extraction_cache WHERE key IN
+                         (SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY accessed_at DESC, key) AS running
+                                           FROM extraction_cache)
+                          WHERE running > ?)''', (self.max_bytes,))
+
+    def clear(self):
+        with transaction(self.db_path) as c:
+            c.execute('DELETE FROM extraction_cache')
+
+    def stats(self):
+        with transaction(self.db_path) as c:
+            c.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM extraction_cache')
+            entries, size = c.fetchone()
+        with self._lock:
+            total = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / total if total else 0.0,
+                    'entries': entries, 'bytes': size}
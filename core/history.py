@@ -0,0 +1,120 @@
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from . import metrics
+from .languages import LANGUAGES
+from .storage import DB_PATH, BufferedWriter, get_connection, migrate, transaction
+
+PAGE_SIZE = 20
+PREVIEW_CHARS = 200
+
+INSERT_SQL = '''INSERT INTO translations (filename, original_text, translated_text, detected_language, target_language, timestamp)
+                VALUES (?, ?, ?, ?, ?, ?)'''
+
+# Writer of the history batch open on this thread, if any
+_batch = threading.local()
+
+
+# Set up SQLite database
+def init_db(db_path=DB_PATH):
+    migrate(db_path)
+
+
+def _fts_available(c):
+    c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'translations_fts'")
+    return c.fetchone() is not None
+
+
+# Context manager grouping every save_to_history call on this thread into one transaction
+@contextmanager
+def history_batch(db_path=DB_PATH):
+    writer = BufferedWriter(INSERT_SQL, db_path)
+    _batch.writer = writer
+    try:
+        yield writer
+    finally:
+        _batch.writer = None
+        with metrics.timed('persist', mode='batch'):
+            writer.flush()
+
+
+# Function to save translation to history
+def save_to_history(filename, original_text, translated_text, detected_language, target_language, db_path=DB_PATH):
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    row = (filename, original_text, translated_text, detected_language, LANGUAGES.get(target_language, "Unknown"), timestamp)
+    writer = getattr(_batch, 'writer', None)
+    if writer is not None and writer.db_path == db_path:
+        writer.add(row)
+        return
+    with metrics.timed('persist', mode='single'), transaction(db_path) as c:
+        c.execute(INSERT_SQL, row)
+
+
+def _fts_query(search):
+    # Quote every term so user input is never parsed as FTS5 syntax
+    return ' '.join('"' + term.replace('"', '""') + '"' for term in search.split())
+
+
+def _encode_cursor(timestamp, row_id):
+    return f"{timestamp}|{row_id}"
+
+
+def _decode_cursor(cursor):
+    try:
+        timestamp, row_id = cursor.rsplit('|', 1)
+        return timestamp, int(row_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+# Function to get one page of translation history, newest first, with truncated texts.
+# Pass the returned cursor as `before` to fetch the next page; it is None on the last page.
+def get_history(limit=PAGE_SIZE, before=None, search=None, filename=None, target_language=None, db_path=DB_PATH):
+    conditions = []
+    params = [PREVIEW_CHARS, PREVIEW_CHARS, PREVIEW_CHARS, PREVIEW_CHARS]
+    position = _decode_cursor(before) if before else None
+    if position is not None:
+        conditions.append('(t.timestamp, t.id) < (?, ?)')
+        params.extend(position)
+    if filename:
+        conditions.append('t.filename = ?')
+        params.append(filename)
+    if target_language:
+        conditions.append('t.target_language = ?')
+        params.append(target_language)
+
+    c = get_connection(db_path).cursor()
+    source = 'translations t'
+    if search and search.strip():
+        if _fts_available(c):
+            source = 'translations t JOIN translations_fts f ON f.rowid = t.id'
+            conditions.append('translations_fts MATCH ?')
+            params.append(_fts_query(search))
+        else:
+            conditions.append('(t.original_text LIKE ? OR t.translated_text LIKE ?)')
+            params.extend([f"%{search.strip()}%"] * 2)
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    c.execute(f'''SELECT t.id, t.timestamp, t.filename, t.detected_language, t.target_language,
+                         substr(t.original_text, 1, ?), length(t.original_text) > ?,
+                         substr(t.translated_text, 1, ?), length(t.translated_text) > ?
+                  FROM {source} {where}
+                  ORDER BY t.timestamp DESC, t.id DESC LIMIT ?''', params + [limit + 1])
+    rows = c.fetchall()
+
+    history = [{'id': row[0], 'timestamp': row[1], 'filename': row[2], 'detected_language': row[3], 'target_language': row[4],
+                'original_text': row[5], 'translated_text': row[7], 'truncated': bool(row[6] or row[8])} for row in rows[:limit]]
+    next_cursor = _encode_cursor(rows[limit - 1][1], rows[limit - 1][0]) if len(rows) > limit else None
+    return history, next_cursor
+
+
+# Function to get one full history entry, or None if it does not exist
+def get_history_entry(entry_id, db_path=DB_PATH):
+    c = get_connection(db_path).cursor()
+    c.execute('''SELECT id, timestamp, filename, detected_language, target_language, original_text, translated_text
+                 FROM translations WHERE id = ?''', (entry_id,))
+    row = c.fetchone()
+    if row is None:
+        return None
+    return {'id': row[0], 'timestamp': row[1], 'filename': row[2], 'detected_language': row[3], 'target_language': row[4],
+            'original_text': row[5], 'translated_text': row[6]}
@@ -0,0 +1,167 @@
+import hashlib
+import io
+import os
+import tempfile
+
+# Upload limits (bytes) and streaming chunk size
+MAX_FILE_SIZE = int(os.environ.get('MAX_FILE_SIZE', 50 * 1024 * 1024))
+MAX_REQUEST_SIZE = int(os.environ.get('MAX_REQUEST_SIZE', 200 * 1024 * 1024))
+CHUNK_SIZE = 64 * 1024
+
+# Formats parsed straight from memory. PDFs are spooled to a uniquely named temp
+# file instead, since page-parallel extraction reopens them from worker processes.
+IN_MEMORY_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.txt', '.doc', '.docx')
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+# One ingested upload: either its bytes (data) or a spooled temp file (path)
+class Upload:
+    def __init__(self, filename, size, sha256, data=None, path=None):
+        self.filename = filename
+        self.size = size
+        self.sha256 = sha256
+        self.data = data
+        self.path = path
+
+    # Arguments for extract_text / FilePipeline.submit
+    def source(self):
+        if self.data is not None:
+            return (self.filename, self.data)
+        return (self.path,)
+
+    def read(self):
+        if self.data is not None:
+            return self.data
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def cleanup(self):
+        if self.path:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            self.path = None
+
+
+# Writable file a multipart parser streams one upload into. The file limit is enforced
+# and the hash computed on every write, so an oversized upload is rejected while it
+# arrives; PDFs go straight to a temp file and everything else to memory, and upload()
+# hands the result over without copying it again.
+class UploadSpool:
+    def __init__(self, filename, max_size=MAX_FILE_SIZE, spool_dir=None):
+        self.filename = filename or ''
+        self.max_size = max_size
+        self.size = 0
+        self._digest = hashlib.sha256()
+        ext = os.path.splitext(self.filename)[1].lower()
+        if ext in IN_MEMORY_EXTENSIONS:
+            self.path = None
+            self._file = io.BytesIO()
+        else:
+            fd, self.path = tempfile.mkstemp(prefix='upload-', suffix=ext, dir=spool_dir)
+            self._file = os.fdopen(fd, 'w+b')
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.max_size:
+            raise UploadTooLarge(f"{self.filename} exceeds the {self.max_size // (1024 * 1024)} MB file limit")
+        self._digest.update(data)
+        return self._file.write(data)
+
+    # Reading, seeking and closing go to the underlying file
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    # Function to turn the spooled bytes into an Upload; the Upload then owns any temp file
+    def upload(self):
+        if self.path is None:
+            return Upload(self.filename, self.size, self._digest.hexdigest(), data=self._file.getvalue())
+        self._file.close()
+        upload = Upload(self.filename, self.size, self._digest.hexdigest(), path=self.path)
+        self.path = None
+        return upload
+
+    # Function to drop a spool that was not turned into an Upload
+    def discard(self):
+        self._file.close()
+        if self.path:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            self.path = None
+
+
+# Tracks the bytes left for the whole request across its files
+class RequestBudget:
+    def __init__(self, max_size=MAX_REQUEST_SIZE):
+        self.max_size = max_size
+        self.remaining = max_size
+
+    def consume(self, size):
+        self.remaining -= size
+        if self.remaining < 0:
+            raise UploadTooLarge(f"Upload exceeds the {self.max_size // (1024 * 1024)} MB request limit")
+
+
+# Function to read an upload stream in bounded chunks, enforcing the size limits
+# as the bytes arrive rather than after the whole file has been buffered
+def read_upload(stream, filename, max_size=MAX_FILE_SIZE, budget=None, spool_dir=None):
+    ext = os.path.splitext(filename)[1].lower()
+    digest = hashlib.sha256()
+    size = 0
+    if ext in IN_MEMORY_EXTENSIONS:
+        chunks, target, path = [], None, None
+    else:
+        fd, path = tempfile.mkstemp(prefix='upload-', suffix=ext, dir=spool_dir)
+        target = os.fdopen(fd, 'wb')
+    try:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_size:
+                raise UploadTooLarge(f"{filename} exceeds the {max_size // (1024 * 1024)} MB file limit")
+            if budget is not None:
+                budget.consume(len(chunk))
+            digest.update(chunk)
+            if target is None:
+                chunks.append(chunk)
+            else:
+                target.write(chunk)
+    except BaseException:
+        if target is not None:
+            target.close()
+            os.remove(path)
+        raise
+    if target is None:
+        return Upload(filename, size, digest.hexdigest(), data=b''.join(chunks))
+    target.close()
+    return Upload(filename, size, digest.hexdigest(), path=path)
+
+
+# Function to ingest a list of (filename, stream) pairs under one request budget.
+# Streams that are already an UploadSpool are taken over as they are; others are read in chunks.
+# Already spooled files are removed again if a later file breaks a limit.
+def ingest_files(files, max_file_size=MAX_FILE_SIZE, max_request_size=MAX_REQUEST_SIZE, spool_dir=None):
+    budget = RequestBudget(max_request_size)
+    uploads = []
+    try:
+        for filename, stream in files:
+            if isinstance(stream, UploadSpool):
+                budget.consume(stream.size)
+                upload = stream.upload()
+                upload.filename = filename
+                uploads.append(upload)
+            else:
+                uploads.append(read_upload(stream, filename, max_file_size, budget, spool_dir))
+    except BaseException:
+        for upload in uploads:
+            upload.cleanup()
+        raise
+    return uploads
@@ -0,0 +1,244 @@
+import os
+import queue
+import threading
+import time
+import uuid
+import logging
+from datetime import datetime
+from .storage import DB_PATH, get_connection, transaction
+
+LEASE_SECONDS = float(os.environ.get('JOB_LEASE_SECONDS', 60))
+# Finished jobs, with their files, texts and kept source bytes, are purged this long after they finish
+JOB_TTL = int(os.environ.get('JOB_TTL', 7 * 24 * 60 * 60))
+
+logger = logging.getLogger(__name__)
+
+
+def _now(offset=0):
+    return datetime.fromtimestamp(time.time() + offset).strftime('%Y-%m-%d %H:%M:%S')
+
+
+# Function to count job files left queued or running, e.g. by a process that stopped
+def pending_files(db_path=DB_PATH):
+    return get_connection(db_path).execute("SELECT COUNT(*) FROM job_files WHERE status IN ('queued', 'running')").fetchone()[0]
+
+
+# Function to read a job's languages; jobs created before multi-language support only have target_language
+def _split_languages(target_languages, target_language):
+    return target_languages.split(',') if target_languages else [target_language]
+
+
+# Background translation jobs. Job and file state lives in SQLite so queued work
+# survives a restart; a pool of worker threads processes files one at a time.
+# process_file(filename, data, target_languages) must return
+# (original_text, {target_language: (translated_text, detected_language)}); job_files keeps
+# the first language's result and job_translations every language's.
+# on_file_done(filename, original_text, translations) is called for each finished file.
+# keep_source(filename) may return True to keep a file's bytes after it is done (for document downloads).
+# Several processes may share the database: a claimed file carries its queue's owner id
+# and a lease that a heartbeat thread renews, and only files whose lease has lapsed
+# (their owner died) are put back in the queue. The heartbeat also purges jobs that
+# finished more than ttl seconds ago.
+class JobQueue:
+    def __init__(self, process_file, workers=4, db_path=DB_PATH, on_file_done=None, keep_source=None, ttl=JOB_TTL):
+        self.process_file = process_file
+        self.keep_source = keep_source
+        self.workers = workers
+        self.db_path = db_path
+        self.ttl = ttl
+        self.on_file_done = on_file_done
+        self.owner = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        self._queue = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._updated = threading.Condition()
+
+    # Function to start the worker threads and requeue work left over from a previous run
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            with transaction(self.db_path) as c:
+                expired = self._expire_leases(c)
+                c.execute("SELECT job_id, position FROM job_files WHERE status = 'queued' ORDER BY rowid")
+                pending = c.fetchall()
+            # The database is the source of truth, so drop anything queued in memory before starting
+            self._queue = queue.Queue()
+            for item in pending:
+                self._queue.put(item)
+            if pending:
+                logger.info("Requeued %d unfinished job files (%d with expired leases)", len(pending), len(expired))
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f'job-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            thread = threading.Thread(target=self._heartbeat, name='job-heartbeat', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    # Function to mark running files whose lease has lapsed as queued again; returns their (job_id, position) pairs.
+    # Files running before leases existed have no lease and count as expired.
+    def _expire_leases(self, c):
+        c.execute('''SELECT job_id, position FROM job_files
+                     WHERE status = 'running' AND (lease_expires IS NULL OR lease_expires < ?)''', (time.time(),))
+        expired = c.fetchall()
+        c.executemany('''UPDATE job_files SET status = 'queued', owner = NULL, lease_expires = NULL, updated_at = ?
+                         WHERE status = 'running' AND job_id = ? AND position = ?''', [(_now(), job_id, position) for job_id, position in expired])
+        return expired
+
+    # Function to delete jobs that finished more than ttl seconds ago; returns how many went
+    def purge(self):
+        with transaction(self.db_path) as c:
+            c.execute("SELECT id FROM jobs WHERE status = 'done' AND updated_at < ?", (_now(-self.ttl),))
+            expired = [(job_id,) for job_id, in c.fetchall()]
+            c.executemany('DELETE FROM job_translations WHERE job_id = ?', expired)
+            c.executemany('DELETE FROM job_files WHERE job_id = ?', expired)
+            c.executemany('DELETE FROM jobs WHERE id = ?', expired)
+        return len(expired)
+
+    # Function to renew the leases on this queue's running files, pick up files whose owner
+    # has died and purge expired jobs
+    def _heartbeat(self):
+        while True:
+            time.sleep(LEASE_SECONDS / 3)
+            try:
+                with transaction(self.db_path) as c:
+                    c.execute("UPDATE job_files SET lease_expires = ? WHERE owner = ? AND status = 'running'",
+                              (time.time() + LEASE_SECONDS, self.owner))
+                    expired = self._expire_leases(c)
+            except Exception:
+                logger.exception("Job lease heartbeat failed")
+                continue
+            if expired:
+                logger.warning("Requeued %d job files whose worker stopped renewing its lease", len(expired))
+            for item in expired:
+                self._queue.put(item)
+            try:
+                self.purge()
+            except Exception:
+                logger.exception("Purging expired jobs failed")
+
+    # Function to create a job from a list of (filename, data) pairs; returns the job id.
+    # target_languages is one language code or a list of them.
+    def submit(self, files, target_languages):
+        if isinstance(target_languages, str):
+            target_languages = [target_languages]
+        target_languages = list(dict.fromkeys(target_languages))
+        job_id = uuid.uuid4().hex
+        timestamp = _now()
+        with transaction(self.db_path) as c:
+            c.execute('''INSERT INTO jobs (id, status, target_language, target_languages, file_count, created_at, updated_at)
+                         VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                      (job_id, 'queued', target_languages[0], ','.join(target_languages), len(files), timestamp, timestamp))
+            c.executemany('''INSERT INTO job_files (job_id, position, filename, data, status, updated_at)
+                             VALUES (?, ?, ?, ?, 'queued', ?)''',
+                          [(job_id, position, filename, data, timestamp) for position, (filename, data) in enumerate(files)])
+        for position in range(len(files)):
+            self._queue.put((job_id, position))
+        return job_id
+
+    # Function to get a job with per-file progress, or None if it does not exist
+    def get(self, job_id):
+        c = get_connection(self.db_path).cursor()
+        c.execute('SELECT id, status, target_language, target_languages, file_count, created_at, updated_at FROM jobs WHERE id = ?', (job_id,))
+        row = c.fetchone()
+        if row is None:
+            return None
+        c.execute('''SELECT position, filename, status, original_text, translated_text, detected_language, error
+                     FROM job_files WHERE job_id = ? ORDER BY position''', (job_id,))
+        files = [{'position': r[0], 'filename': r[1], 'status': r[2], 'original_text': r[3], 'translated_text': r[4],
+                  'detected_language': r[5], 'error': r[6], 'translations': []} for r in c.fetchall()]
+        c.execute('''SELECT position, target_language, translated_text, detected_language FROM job_translations
+                     WHERE job_id = ? ORDER BY position, rowid''', (job_id,))
+        for position, target_language, translated_text, detected_language in c.fetchall():
+            files[position]['translations'].append({'target_language': target_language, 'translated_text': translated_text,
+                                                     'detected_language': detected_language})
+        completed = sum(1 for f in files if f['status'] in ('done', 'failed'))
+        return {'id': row[0], 'status': row[1], 'target_language': row[2], 'target_languages': _split_languages(row[3], row[2]),
+                'file_count': row[4], 'created_at': row[5], 'updated_at': row[6], 'completed': completed, 'files': files}
+
+    # Function to get the bytes kept for a finished job file, or None
+    def get_source(self, job_id, position):
+        row = get_connection(self.db_path).execute("SELECT data FROM job_files WHERE job_id = ? AND position = ? AND status = 'done'",
+                                                   (job_id, position)).fetchone()
+        return row[0] if row else None
+
+    # Function to get the rendered translated document of a job file in one language, or None
+    def get_document(self, job_id, position, target_language):
+        row = get_connection(self.db_path).execute('''SELECT document FROM job_translations
+                                                       WHERE job_id = ? AND position = ? AND target_language = ?''',
+                                                   (job_id, position, target_language)).fetchone()
+        return row[0] if row else None
+
+    # Function to keep the rendered translated document of a job file until the job is purged
+    def put_document(self, job_id, position, target_language, document):
+        with transaction(self.db_path) as c:
+            c.execute('UPDATE job_translations SET document = ? WHERE job_id = ? AND position = ? AND target_language = ?',
+                      (document, job_id, position, target_language))
+
+    # Function to block until any job file finishes in this process, or the timeout passes
+    def wait_for_update(self, timeout=1.0):
+        with self._updated:
+            self._updated.wait(timeout)
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def _worker(self):
+        while True:
+            job_id, position = self._queue.get()
+            try:
+                self._run(job_id, position)
+            except Exception:
+                logger.exception("Job %s file %d crashed", job_id, position)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job_id, position):
+        with transaction(self.db_path) as c:
+            c.execute('''SELECT f.filename, f.data, j.target_language, j.target_languages FROM job_files f
+                         JOIN jobs j ON j.id = f.job_id WHERE f.job_id = ? AND f.position = ?''', (job_id, position))
+            row = c.fetchone()
+            if row is None:
+                return
+            filename, data = row[:2]
+            target_languages = _split_languages(row[3], row[2])
+            # Claim the file atomically so it is never processed twice
+            c.execute('''UPDATE job_files SET status = 'running', owner = ?, lease_expires = ?, updated_at = ?
+                         WHERE status = 'queued' AND job_id = ? AND position = ?''',
+                      (self.owner, time.time() + LEASE_SECONDS, _now(), job_id, position))
+            if c.rowcount == 0:
+                return
+            c.execute("UPDATE jobs SET status = 'running', updated_at = ? WHERE id = ? AND status = 'queued'", (_now(), job_id))
+
+        try:
+            original_text, translations = self.process_file(filename, data, target_languages)
+            translated_text, detected_language = translations[target_languages[0]]
+            status, error = 'done', None
+        except Exception as e:
+            original_text, translations, translated_text, detected_language = None, {}, None, None
+            status, error = 'failed', str(e)
+
+        # Uploaded bytes are dropped once the file is finished, unless keep_source wants them
+        keep = status == 'done' and self.keep_source is not None and self.keep_source(filename)
+        with transaction(self.db_path) as c:
+            c.execute('''UPDATE job_files SET status = ?, data = CASE WHEN ? THEN data END, original_text = ?, translated_text = ?,
+                         detected_language = ?, error = ?, owner = NULL, lease_expires = NULL, updated_at = ?
+                         WHERE status = 'running' AND owner = ? AND job_id = ? AND position = ?''',
+                      (status, keep, original_text, translated_text, detected_language, error, _now(), self.owner, job_id, position))
+            # The lease lapsed and the file was requeued for another worker, whose result wins
+            if c.rowcount == 0:
+                logger.warning("Job %s file %d lost its lease; dropping this result", job_id, position)
+                return
+            c.executemany('''INSERT OR REPLACE INTO job_translations (job_id, position, target_language, translated_text, detected_language)
+                             VALUES (?, ?, ?, ?, ?)''',
+                          [(job_id, position, language) + tuple(translations[language]) for language in target_languages if language in translations])
+            c.execute("SELECT COUNT(*) FROM job_files WHERE job_id = ? AND status IN ('queued', 'running')", (job_id,))
+            if c.fetchone()[0] == 0:
+                c.execute("UPDATE jobs SET status = 'done', updated_at = ? WHERE id = ?", (_now(), job_id))
+
+        with self._updated:
+            self._updated.notify_all()
+
+        if status == 'done' and self.on_file_done is not None:
+            self.on_file_done(filename, original_text, translations)
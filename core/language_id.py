@@ -0,0 +1,287 @@
+import math
+import os
+import re
+import unicodedata
+from collections import Counter
+from functools import lru_cache
+
+# Detection settings: only a bounded prefix of the document is inspected
+SAMPLE_CHARS = int(os.environ.get('LANGUAGE_SAMPLE_CHARS', 2000))
+PROFILE_SIZE = 400
+MIN_LATIN_LETTERS = 100
+SKIP_CONFIDENCE = float(os.environ.get('LANGUAGE_SKIP_CONFIDENCE', 0.6))
+# Highest confidence reported for a guess from a script several languages share
+SHARED_SCRIPT_CONFIDENCE = 0.3
+
+# Script of each text, keyed by the first word of the Unicode character name, to the
+# language guessed for it. Scripts in SHARED_SCRIPTS only give the most likely language.
+SCRIPT_LANGUAGES = {
+    'HANGUL': 'ko',
+    'HIRAGANA': 'ja',
+    'KATAKANA': 'ja',
+    'CJK': 'zh-cn',
+    'THAI': 'th',
+    'LAO': 'lo',
+    'KHMER': 'km',
+    'MYANMAR': 'my',
+    'GEORGIAN': 'ka',
+    'ARMENIAN': 'hy',
+    'HEBREW': 'iw',
+    'GREEK': 'el',
+    'ETHIOPIC': 'am',
+    'SINHALA': 'si',
+    'TAMIL': 'ta',
+    'TELUGU': 'te',
+    'KANNADA': 'kn',
+    'MALAYALAM': 'ml',
+    'GUJARATI': 'gu',
+    'GURMUKHI': 'pa',
+    'BENGALI': 'bn',
+    'ORIYA': 'or',
+    'DEVANAGARI': 'hi',
+    'ARABIC': 'ar',
+    'CYRILLIC': 'ru',
+}
+
+# Scripts written by more than one language of LANGUAGES: a guess from the script alone
+# (Ukrainian without ї/є/ґ reads as Russian, Nepali as Hindi, Traditional Chinese as
+# Simplified) must never be confident enough to skip translation
+SHARED_SCRIPTS = {
+    'ARABIC',  # ar, fa, ur, ps, sd, ug
+    'CYRILLIC',  # ru, uk, be, bg, sr, mk, kk, ky, mn, tg
+    'DEVANAGARI',  # hi, mr, ne
+    'CJK',  # zh-cn, zh-tw
+    'HEBREW',  # iw, yi
+}
+
+# Latin-script languages close enough that trigrams of a short text confuse them
+# (Catalan reads as Spanish, Bosnian and Serbian as Croatian); a guess inside one of
+# these families is capped like a shared script
+LATIN_FAMILIES = [
+    {'es', 'ca', 'gl', 'pt'},
+    {'hr', 'bs', 'sr'},
+    {'cs', 'sk'},
+    {'da', 'no'},
+    {'id', 'ms'},
+]
+# Smallest lead over the runner-up (1 - second / best score) a Latin guess needs to
+# be trusted; languages without a seed profile land on their nearest seed by a small lead
+LATIN_MIN_MARGIN = float(os.environ.get('LANGUAGE_MIN_MARGIN', 0.2))
+
+# Letters that single out one language within a shared script; checked in order
+DISTINGUISHING_LETTERS = {
+    'ARABIC': [('ur', 'ےٹڈڑں'), ('fa', 'پچژگ')],
+    'CYRILLIC': [('kk', 'әғқңөұһ'), ('uk', 'їєґ'), ('be', 'ў'), ('sr', 'ђћџ'), ('mk', 'ѓќѕ'), ('mn', 'өү')],
+    'DEVANAGARI': [('mr', 'ळ')],
+}
+
+# Seed texts (Article 1 of the Universal Declaration of Human Rights, plus frequent
+# words for the most common languages) from which the Latin-script trigram profiles are built
+LATIN_SEEDS = {
+    'en': "All human beings are born free and equal in dignity and rights. They are endowed with reason and conscience "
+          "and should act towards one another in a spirit of brotherhood. the of and to in is that it was for on are with "
+          "as this be at have from or by not but what all were when we there can an your which their said if will each "
+          "about how up out them then she many some so these would other into has more her two like him see time could",
+    'fr': "Tous les êtres humains naissent libres et égaux en dignité et en droits. Ils sont doués de raison et de "
+          "conscience et doivent agir les uns envers les autres dans un esprit de fraternité. le de un être et à il avoir "
+          "ne je son que se qui ce dans en du elle au pour pas vous par sur faire plus dire me on mon lui nous comme mais "
+          "pouvoir avec tout aller voir bien où sans tu ou leur homme si deux moi vouloir te femme venir quand grand",
+    'de': "Alle Menschen sind frei und gleich an Würde und Rechten geboren. Sie sind mit Vernunft und Gewissen begabt "
+          "und sollen einander im Geist der Brüderlichkeit begegnen. der die und in den von zu das mit sich des auf für "
+          "ist im dem nicht ein eine als auch es an werden aus er hat dass sie nach wird bei einer um am sind noch wie "
+          "einem über einen so zum war haben nur oder aber vor zur bis mehr durch man sein wurde sei",
+    'es': "Todos los seres humanos nacen libres e iguales en dignidad y derechos y, dotados como están de razón y "
+          "conciencia, deben comportarse fraternalmente los unos con los otros. de la que el en y a los se del las un por "
+          "con no una su para es al lo como más pero sus le ya o este sí porque esta entre cuando muy sin sobre también "
+          "me hasta hay donde quien desde todo nos durante todos uno les ni contra otros ese eso ante ellos esto",
+    'it': "Tutti gli esseri umani nascono liberi ed eguali in dignità e diritti. Essi sono dotati di ragione e di "
+          "coscienza e devono agire gli uni verso gli altri in spirito di fratellanza. di e il la che in a per un è non "
+          "una sono le si con da del della i al dei come lo ma gli anche più se ha alla nel questo ci delle essere o mi "
+          "su loro tutto quando io anno cosa molto perché fare ancora già stato era",
+    'pt': "Todos os seres humanos nascem livres e iguais em dignidade e em direitos. Dotados de razão e de consciência, "
+          "devem agir uns para com os outros em espírito de fraternidade. de a o que e do da em um para é com não uma os "
+          "no se na por mais as dos como mas foi ao ele das tem à seu sua ou ser quando muito há nos já está eu também "
+          "só pelo pela até isso ela entre era depois sem mesmo aos ter seus quem nas me esse eles estão você tinha",
+    'nl': "Alle mensen worden vrij en gelijk in waardigheid en rechten geboren. Zij zijn begiftigd met verstand en "
+          "geweten, en behoren zich jegens elkander in een geest van broederschap te gedragen. de van een het en in is "
+          "dat op te zijn voor met die niet aan er om ook als bij of door maar dan naar uit nog wel worden tot over hij "
+          "zij wordt kan was werd heeft hebben deze dit onder wat meer zo zou geen",
+    'sv': "Alla människor är födda fria och lika i värde och rättigheter. De har utrustats med förnuft och samvete och "
+          "bör handla gentemot varandra i en anda av broderskap. och i att det som en på är av för med till den har de "
+          "inte om ett han men var jag sig från vi så kan man när år säger hon under också efter eller nu sin där vid",
+    'da': "Alle mennesker er født frie og lige i værdighed og rettigheder. De er udstyret med fornuft og samvittighed, "
+          "og de bør handle mod hverandre i en broderskabets ånd.",
+    'no': "Alle mennesker er født frie og med samme menneskeverd og menneskerettigheter. De er utstyrt med fornuft og "
+          "samvittighet og bør handle mot hverandre i brorskapets ånd.",
+    'fi': "Kaikki ihmiset syntyvät vapaina ja tasavertaisina arvoltaan ja oikeuksiltaan. Heille on annettu järki ja "
+          "omatunto, ja heidän on toimittava toisiaan kohtaan veljeyden hengessä.",
+    'pl': "Wszyscy ludzie rodzą się wolni i równi pod względem swej godności i swych praw. Są oni obdarzeni rozumem i "
+          "sumieniem i powinni postępować wobec innych w duchu braterstwa.",
+    'cs': "Všichni lidé rodí se svobodní a sobě rovní co do důstojnosti a práv. Jsou nadáni rozumem a svědomím a mají "
+          "spolu jednat v duchu bratrství.",
+    'sk': "Všetci ľudia sa rodia slobodní a sebe rovní, čo sa týka ich dôstojnosti a práv. Sú obdarení rozumom a "
+          "svedomím a majú navzájom jednať v bratskom duchu.",
+    'hu': "Minden emberi lény szabadon születik és egyenlő méltósága és joga van. Az emberek, ésszel és lelkiismerettel "
+          "bírván, egymással szemben testvéri szellemben kell hogy viseltessenek.",
+    'ro': "Toate ființele umane se nasc libere și egale în demnitate și în drepturi. Ele sunt înzestrate cu rațiune și "
+          "conștiință și trebuie să se comporte unele față de altele în spiritul fraternității.",
+    'tr': "Bütün insanlar hür, haysiyet ve haklar bakımından eşit doğarlar. Akıl ve vicdana sahiptirler ve birbirlerine "
+          "karşı kardeşlik zihniyeti ile hareket etmelidirler. bir ve bu da de için ile gibi daha çok olarak olan ama kadar "
+          "sonra her şey ben sen biz siz onlar var yok değil mı mi ne zaman nasıl neden çünkü ancak ise olduğu "
+          "olduğunu tarafından üzerinde arasında göre",
+    'az': "Bütün insanlar ləyaqət və hüquqlarına görə azad və bərabər doğulurlar. Onların şüurları və vicdanları var "
+          "və bir-birinə münasibətdə qardaşlıq ruhunda davranmalıdırlar.",
+    'id': "Semua orang dilahirkan merdeka dan mempunyai martabat dan hak-hak yang sama. Mereka dikaruniai akal dan hati "
+          "nurani dan hendaknya bergaul satu sama lain dalam semangat persaudaraan. yang di ini itu dengan untuk tidak dari "
+          "akan pada juga ke karena ada oleh bisa saya kami Anda mereka sudah belum harus jika atau tetapi seperti telah "
+          "dapat lebih sangat tentang silakan hubungi",
+    'ms': "Semua manusia dilahirkan bebas dan samarata dari segi kemuliaan dan hak-hak. Mereka mempunyai pemikiran dan "
+          "perasaan hati dan hendaklah bertindak di antara satu sama lain dengan semangat persaudaraan. yang di ini itu "
+          "untuk tidak dari akan pada juga ke kerana ada oleh boleh saya kami anda mereka sudah belum perlu jika atau "
+          "tetapi seperti telah lebih sangat tentang sila",
+    'vi': "Tất cả mọi người sinh ra đều được tự do và bình đẳng về nhân phẩm và quyền lợi. Mọi con người đều được tạo "
+          "hóa ban cho lý trí và lương tâm và cần phải đối xử với nhau trong tình anh em.",
+    'tl': "Ang lahat ng tao'y isinilang na malaya at pantay-pantay sa karangalan at mga karapatan. Sila'y pinagkalooban "
+          "ng katwiran at budhi at dapat magturingan sa isa't isa sa diwa ng pagkakapatiran.",
+    'sw': "Watu wote wamezaliwa huru, hadhi na haki zao ni sawa. Wote wamejaliwa akili na dhamiri, hivyo yapasa "
+          "watendeane kindugu.",
+    'hr': "Sva ljudska bića rađaju se slobodna i jednaka u dostojanstvu i pravima. Ona su obdarena razumom i sviješću "
+          "pa jedna prema drugima trebaju postupati u duhu bratstva.",
+    'sl': "Vsi ljudje se rodijo svobodni in imajo enako dostojanstvo in enake pravice. Obdarjeni so z razumom in vestjo "
+          "in bi morali ravnati drug z drugim kakor bratje.",
+    'et': "Kõik inimesed sünnivad vabadena ja võrdsetena oma väärikuselt ja õigustelt. Neile on antud mõistus ja "
+          "südametunnistus ja nende suhtumist üksteisesse peab kandma vendluse vaim.",
+    'lv': "Visi cilvēki piedzimst brīvi un vienlīdzīgi savā pašcieņā un tiesībās. Viņi ir apveltīti ar saprātu un "
+          "sirdsapziņu, un viņiem jāizturas citam pret citu brālības garā.",
+    'lt': "Visi žmonės gimsta laisvi ir lygūs savo orumu ir teisėmis. Jiems suteiktas protas ir sąžinė ir jie turi "
+          "elgtis vienas kito atžvilgiu kaip broliai.",
+    'ca': "Tots els éssers humans neixen lliures i iguals en dignitat i en drets. Són dotats de raó i de consciència, "
+          "i han de comportar-se fraternalment els uns amb els altres.",
+    'gl': "Tódolos seres humanos nacen libres e iguais en dignidade e dereitos e, dotados como están de razón e "
+          "conciencia, débense comportar fraternalmente uns cos outros.",
+    'eu': "Gizon-emakume guztiak aske jaiotzen dira, duintasun eta eskubide berberak dituztela; eta ezaguera eta "
+          "kontzientzia dutenez gero, elkarren artean senide legez jokatu beharra dute.",
+    'af': "Alle menslike wesens word vry, met gelyke waardigheid en regte, gebore. Hulle het rede en gewete en behoort "
+          "in die gees van broederskap teenoor mekaar op te tree.",
+    'ga': "Saolaítear na daoine uile saor agus comhionann i ndínit agus i gcearta. Tá bua an réasúin agus an "
+          "choinsiasa acu agus ba cheart dóibh gníomhú i dtreo a chéile i spiorad an bhráithreachais.",
+    'cy': "Genir pawb yn rhydd ac yn gydradd â'i gilydd mewn urddas a hawliau. Fe'u cynysgaeddwyd â rheswm a "
+          "chydwybod, a dylai pawb ymddwyn y naill at y llall mewn ysbryd cymodlon.",
+    'sq': "Të gjithë njerëzit lindin të lirë dhe të barabartë në dinjitet dhe në të drejta. Ata kanë arsye dhe "
+          "ndërgjegje dhe duhet të sillen ndaj njëri-tjetrit me frymë vëllazërimi.",
+    'is': "Hver maður er borinn frjáls og jafn öðrum að virðingu og réttindum. Menn eru gæddir vitsmunum og samvizku, "
+          "og ber þeim að breyta bróðurlega hverjum við annan.",
+    'mt': "Il-bnedmin kollha jitwieldu ħielsa u ugwali fid-dinjità u d-drittijiet. Huma mogħnija bir-raġuni u "
+          "bil-kuxjenza u għandhom iġibu ruħhom ma' xulxin bi spirtu ta' aħwa.",
+    'eo': "Ĉiuj homoj estas denaske liberaj kaj egalaj laŭ digno kaj rajtoj. Ili posedas racion kaj konsciencon, kaj "
+          "devus konduti unu al alia en spirito de frateco.",
+    'la': "Omnes homines dignitate et iure liberi et pares nascuntur. Ratione conscientiaque praediti sunt et alii "
+          "erga alios cum fraternitate se gerere debent.",
+    'uz': "Barcha odamlar erkin, qadr-qimmat va huquqlarda teng bo'lib tug'iladilar. Ular aql va vijdon sohibidirlar "
+          "va bir-birlariga birodarlarcha munosabatda bo'lishlari zarur.",
+    'so': "Aadanaha dhammaantiis wuxuu dhashaa isagoo xor ah kana siman xagga sharafta iyo xuquuqada. Waxaa Alle "
+          "siiyay aqoon iyo wacyi, waana in qof la arkaa qofka kale ula dhaqmaa si walaaltinimo ah.",
+    'fy': "Alle minsken wurde frij en gelyk yn weardigens en rjochten berne. Hja hawwe ferstân en gewisse meikrigen en "
+          "hja moatte har foar inoar oer hâlde yn in geast fan bruorskip.",
+    'lb': "All Mënsch kënnt fräi a mat der selwechter Dignitéit an de selwechte Rechter op d'Welt. Jiddereen huet säi "
+          "Verstand a säi Gewëssen a soll sech an engem Geescht vu Bridderlechkeet géigeniwwer deenen anere behuelen.",
+    'ht': "Tout moun fèt lib, egal ego pou diyite kou wè dwa. Nou gen konesans ak konsyans epi nou dwe aji youn ak lòt "
+          "ak lespri fratènite.",
+    'ceb': "Ang tanang katawhan gipakatawo nga may kagawasan ug managsama sa kabililhon ug katungod. Sila gihatagan "
+           "ug salabutan ug tanlag ug kinahanglang mag-ilhanay sila isip managsoon sa usa'g usa.",
+    'bs': "Sva ljudska bića rađaju se slobodna i jednaka u dostojanstvu i pravima. Ona su obdarena razumom i sviješću "
+          "i trebaju jedno prema drugome postupati u duhu bratstva.",
+}
+
+# Codes that name the same language in LANGUAGES
+LANGUAGE_ALIASES = {'he': 'iw', 'jv': 'jw', 'zh': 'zh-cn'}
+
+_WORD_PATTERN = re.compile(r"[^\W\d_]+")
+
+
+def _trigrams(text):
+    counts = Counter()
+    for word in _WORD_PATTERN.findall(text.lower()):
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            counts[padded[i:i + 3]] += 1
+    return counts
+
+
+def _profile(counts, size=PROFILE_SIZE):
+    top = counts.most_common(size)
+    norm = math.sqrt(sum(count * count for _, count in top)) or 1.0
+    return {gram: count / norm for gram, count in top}
+
+
+# Trigram tables for the Latin-script languages, built once per process
+@lru_cache(maxsize=1)
+def latin_profiles():
+    return {code: _profile(_trigrams(seed)) for code, seed in LATIN_SEEDS.items()}
+
+
+def _script(char):
+    try:
+        return unicodedata.name(char).split(' ', 1)[0]
+    except ValueError:
+        return None
+
+
+def _match_latin(sample):
+    profile = _profile(_trigrams(sample))
+    if not profile:
+        return None, 0.0
+    scores = sorted(((sum(weight * table.get(gram, 0.0) for gram, weight in profile.items()), code)
+                     for code, table in latin_profiles().items()), reverse=True)
+    best_score, best_code = scores[0]
+    if best_score <= 0:
+        return None, 0.0
+    second_score = scores[1][0] if len(scores) > 1 else 0.0
+    # Confidence grows with both the similarity and the lead over the runner-up
+    margin = 1 - second_score / best_score
+    confidence = min(1.0, best_score * 2) * 0.5 + min(1.0, margin * 4) * 0.5
+    if margin < LATIN_MIN_MARGIN or any(best_code in family for family in LATIN_FAMILIES):
+        confidence = min(confidence, SHARED_SCRIPT_CONFIDENCE)
+    return best_code, round(confidence, 3)
+
+
+# Function to identify the language of a text offline.
+# Returns (language_code, confidence) with codes from googletrans LANGUAGES, or (None, 0.0).
+def detect_language(text, sample_chars=SAMPLE_CHARS):
+    sample = text[:sample_chars]
+    scripts = Counter()
+    for char in sample:
+        if char.isalpha():
+            scripts[_script(char)] += 1
+    letters = sum(scripts.values())
+    if not letters:
+        return None, 0.0
+
+    # Japanese text mixes kana with CJK ideographs, so any kana decides it
+    if scripts['HIRAGANA'] or scripts['KATAKANA']:
+        return 'ja', round((scripts['HIRAGANA'] + scripts['KATAKANA'] + scripts['CJK']) / letters, 3)
+
+    script, count = scripts.most_common(1)[0]
+    share = count / letters
+    if script == 'LATIN':
+        code, confidence = _match_latin(sample)
+        # Trigram statistics of a few words are not worth much
+        return code, round(confidence * share * min(1.0, letters / MIN_LATIN_LETTERS), 3)
+    if script not in SCRIPT_LANGUAGES:
+        return None, 0.0
+    code = SCRIPT_LANGUAGES[script]
+    lowered = sample.lower()
+    for candidate, letters_of in DISTINGUISHING_LETTERS.get(script, []):
+        if any(letter in lowered for letter in letters_of):
+            code = candidate
+            break
+    if script in SHARED_SCRIPTS:
+        return code, round(min(share, SHARED_SCRIPT_CONFIDENCE), 3)
+    return code, round(share, 3)
+
+
+# Function to check whether two LANGUAGES codes name the same language
+def same_language(code, other):
+    if not code or not other:
+        return False
+    return LANGUAGE_ALIASES.get(code, code) == LANGUAGE_ALIASES.get(other, other)
@@ -0,0 +1,21 @@
+import importlib.util
+import os
+
+
+# Function to load googletrans' language table. Its constants module is read
+# straight from the package directory: importing googletrans itself pulls in the
+# whole HTTP client stack, which the UIs don't need until they translate.
+def _load_languages():
+    spec = importlib.util.find_spec('googletrans')
+    if spec is not None and spec.submodule_search_locations:
+        path = os.path.join(list(spec.submodule_search_locations)[0], 'constants.py')
+        if os.path.exists(path):
+            constants_spec = importlib.util.spec_from_file_location('_googletrans_constants', path)
+            constants = importlib.util.module_from_spec(constants_spec)
+            constants_spec.loader.exec_module(constants)
+            return constants.LANGUAGES
+    from googletrans import LANGUAGES
+    return LANGUAGES
+
+
+LANGUAGES = _load_languages()
@@ -0,0 +1,188 @@
+import contextvars
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Metric name prefix and histogram buckets (seconds)
+PREFIX = 'translator_'
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, math.inf)
+
+# Known metrics: name -> (type, help)
+METRICS = {
+    'stage_seconds': ('histogram', "Time spent in each pipeline stage"),
+    'request_seconds': ('histogram', "Flask request latency by route"),
+    'requests_total': ('counter', "Flask requests by route and status"),
+    'stage_errors_total': ('counter', "Stage results that were error messages instead of text"),
+    'bytes_processed_total': ('counter', "Input bytes handed to extraction"),
+    'pages_processed_total': ('counter', "PDF pages extracted, by method (text layer, OCR or failed OCR)"),
+    'characters_total': ('counter', "Characters extracted and translated"),
+    'ocr_images_total': ('counter', "Images sent to OCR, or skipped as blank"),
+    'ocr_words_total': ('counter', "OCR'd words by Tesseract confidence (low is below OCR_LOW_CONFIDENCE)"),
+}
+
+_trace = contextvars.ContextVar('metrics_trace', default=None)
+_capture = threading.local()
+
+
+# Function to build a hashable label set
+def _labels(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+# In-process metric store. Values from other sources (caches, client, queue) are
+# read at scrape time through registered collectors.
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.collectors = []
+
+    def inc(self, name, value=1, labels=()):
+        with self._lock:
+            self.counters[(name, labels)] = self.counters.get((name, labels), 0) + value
+
+    def observe(self, name, value, labels=()):
+        with self._lock:
+            histogram = self.histograms.get((name, labels))
+            if histogram is None:
+                histogram = self.histograms[(name, labels)] = Histogram()
+            histogram.observe(value)
+
+    # Function to add a collector returning (name, type, help, labels dict, value) tuples
+    def register_collector(self, fn):
+        self.collectors.append(fn)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            series = {}
+            for (name, labels), value in self.counters.items():
+                series.setdefault(name, []).append((labels, value))
+            for (name, labels), histogram in self.histograms.items():
+                series.setdefault(name, []).append((labels, (list(histogram.counts), histogram.sum, histogram.count)))
+        for name in sorted(series):
+            kind, help_text = METRICS.get(name, ('untyped', name))
+            lines += [f"# HELP {PREFIX}{name} {help_text}", f"# TYPE {PREFIX}{name} {kind}"]
+            for labels, value in sorted(series[name], key=lambda item: item[0]):
+                if kind == 'histogram':
+                    counts, total, count = value
+                    cumulative = 0
+                    for bound, bucket_count in zip(BUCKETS, counts):
+                        cumulative += bucket_count
+                        le = '+Inf' if bound == math.inf else repr(bound)
+                        lines.append(f"{PREFIX}{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+                    lines.append(f"{PREFIX}{name}_sum{_format_labels(labels)} {total}")
+                    lines.append(f"{PREFIX}{name}_count{_format_labels(labels)} {count}")
+                else:
+                    lines.append(f"{PREFIX}{name}{_format_labels(labels)} {value}")
+
+        collected = {}
+        for collector in list(self.collectors):
+            for name, kind, help_text, labels, value in collector():
+                collected.setdefault(name, (kind, help_text, []))[2].append((_labels(labels), value))
+        for name in sorted(collected):
+            kind, help_text, samples = collected[name]
+            lines += [f"# HELP {PREFIX}{name} {help_text}", f"# TYPE {PREFIX}{name} {kind}"]
+            lines += [f"{PREFIX}{name}{_format_labels(labels)} {value}" for labels, value in samples]
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+REGISTRY = Registry()
+
+
+# Function to record a metric event: applied to the registry, or queued while a
+# worker process captures events for its parent
+def _record(kind, name, value, labels):
+    events = getattr(_capture, 'events', None)
+    if events is not None:
+        events.append((kind, name, value, labels))
+        return
+    if kind == 'inc':
+        REGISTRY.inc(name, value, labels)
+    else:
+        REGISTRY.observe(name, value, labels)
+        trace = _trace.get()
+        if trace is not None:
+            trace.append((name, dict(labels), value))
+
+
+def inc(name, value=1, **labels):
+    _record('inc', name, value, _labels(labels))
+
+
+def observe(name, value, **labels):
+    _record('observe', name, value, _labels(labels))
+
+
+# Context manager timing a block into the stage_seconds histogram
+@contextmanager
+def timed(stage, **labels):
+    began = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe('stage_seconds', time.perf_counter() - began, stage=stage, **labels)
+
+
+# Function to run fn in a worker process and return (result, metric events) so the
+# parent can replay them; must stay module-level to be picklable
+def run_captured(fn, *args):
+    _capture.events = []
+    try:
+        return fn(*args), _capture.events
+    finally:
+        _capture.events = None
+
+
+def replay(events):
+    for kind, name, value, labels in events:
+        _record(kind, name, value, labels)
+
+
+# Function to label a file by its extension
+def file_format(file_path):
+    return os.path.splitext(file_path)[1].lstrip('.').lower() or 'none'
+
+
+# Per-request traces: start_trace() collects every observation made in this context
+# (and in contexts copied from it) until the returned list is read
+def start_trace():
+    trace = []
+    _trace.set(trace)
+    return trace
+
+
+def end_trace():
+    _trace.set(None)
+
+
+def render():
+    return REGISTRY.render()
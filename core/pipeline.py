@@ -0,0 +1,204 @@
+import contextvars
+import logging
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from . import metrics
+from .extraction import is_complete_extraction
+from .extraction_cache import source_sha256
+
+# Concurrency limits: extraction (OCR, pdfplumber) is CPU-bound, translation is network-bound
+EXTRACT_WORKERS = int(os.environ.get('EXTRACT_WORKERS', os.cpu_count() or 1))
+TRANSLATE_WORKERS = int(os.environ.get('TRANSLATE_WORKERS', 8))
+logger = logging.getLogger(__name__)
+
+
+# Pipelined executor: each file is extracted on a process pool and handed to a
+# thread pool for translation as soon as its extraction finishes.
+# extract_fn must be a module-level function so it can be sent to worker processes.
+# detect_fn(text) -> (language, confidence) is optional; with it, submit_many detects
+# once and passes detection= to translate_fn for every target language.
+class FilePipeline:
+    def __init__(self, extract_fn, translate_fn, extract_workers=EXTRACT_WORKERS, translate_workers=TRANSLATE_WORKERS,
+                 extraction_cache=None, detect_fn=None):
+        self.extract_fn = extract_fn
+        self.translate_fn = translate_fn
+        self.detect_fn = detect_fn
+        self.extraction_cache = extraction_cache
+        self.extract_workers = max(1, extract_workers)
+        self.extract_pool = ProcessPoolExecutor(max_workers=self.extract_workers)
+        self._pool_lock = threading.Lock()
+        self.translate_pool = ThreadPoolExecutor(max_workers=max(1, translate_workers), thread_name_prefix='translate')
+
+    def _translate(self, original_text, target_language):
+        translated_text, detected_language = self.translate_fn(original_text, target_language)
+        return original_text, translated_text, detected_language
+
+    # Function to submit to the extraction pool; returns (pool, future). A worker that dies
+    # (out of memory, a crash in a native library) breaks the whole pool, so a broken pool
+    # is replaced before use.
+    def _submit_extract(self, args):
+        with self._pool_lock:
+            try:
+                return self.extract_pool, self.extract_pool.submit(metrics.run_captured, self.extract_fn, *args)
+            except BrokenProcessPool:
+                self._replace_extract_pool(self.extract_pool)
+                return self.extract_pool, self.extract_pool.submit(metrics.run_captured, self.extract_fn, *args)
+
+    # Function to swap in a new extraction pool, unless the broken one was already replaced
+    def _replace_extract_pool(self, broken):
+        if self.extract_pool is not broken:
+            return
+        logger.warning("Extraction worker pool is broken; starting a new one")
+        broken.shutdown(wait=False, cancel_futures=True)
+        self.extract_pool = ProcessPoolExecutor(max_workers=self.extract_workers)
+
+    def _cache_extraction(self, cache_entry, original_text):
+        if is_complete_extraction(original_text):
+            self.extraction_cache.put(cache_entry[0], cache_entry[1], original_text)
+
+    # Function to extract one source; returns a future resolving to its text.
+    # Known files are served from the extraction cache without touching the process pool.
+    def _extract(self, source, sha256, context):
+        args = source if isinstance(source, tuple) else (source,)
+        text = Future()
+
+        cache_entry = None
+        if self.extraction_cache is not None:
+            try:
+                cache_entry = (sha256 or source_sha256(args), args[0])
+            except OSError:
+                cache_entry = None
+        if cache_entry is not None:
+            cached = self.extraction_cache.get(*cache_entry)
+            if cached is not None:
+                text.set_result(cached)
+                return text
+
+        def on_extracted(pool, extract_future, retried=False):
+            try:
+                original_text, events = extract_future.result()
+                # Metrics recorded in the worker process are applied here
+                context.run(metrics.replay, events)
+            except BrokenProcessPool as e:
+                # Every file in flight fails when one worker dies. Retry each once in a process
+                # of its own, so only the file that kills its worker again ends up as an error.
+                if not retried:
+                    with self._pool_lock:
+                        self._replace_extract_pool(pool)
+                    isolated = ProcessPoolExecutor(max_workers=1)
+                    retry = isolated.submit(metrics.run_captured, self.extract_fn, *args)
+                    isolated.shutdown(wait=False)
+                    retry.add_done_callback(lambda f: on_extracted(isolated, f, retried=True))
+                    return
+                original_text = f"Error processing file: {str(e)}"
+            except Exception as e:
+                original_text = f"Error processing file: {str(e)}"
+            # Store fresh extractions from a translation thread, off the process pool's callback thread
+            if cache_entry is not None:
+                self.translate_pool.submit(self._cache_extraction, cache_entry, original_text)
+            text.set_result(original_text)
+
+        pool, extract_future = self._submit_extract(args)
+        extract_future.add_done_callback(lambda f: on_extracted(pool, f))
+        return text
+
+    # Returns a future resolving to (original_text, translated_text, detected_language).
+    # source is a file path, or a tuple of arguments for extract_fn such as (filename, data).
+    # sha256 of the content may be passed when already known; it is only used for the extraction cache.
+    def submit(self, source, target_language, sha256=None):
+        result = Future()
+        # Run the callbacks and translation in the caller's context so per-request traces follow the file
+        context = contextvars.copy_context()
+
+        def on_text(text_future):
+            translate_future = self.translate_pool.submit(context.run, self._translate, text_future.result(), target_language)
+            translate_future.add_done_callback(lambda f: _copy_result(f, result))
+
+        self._extract(source, sha256, context).add_done_callback(on_text)
+        return result
+
+    # Returns a future resolving to (original_text, {target_language: (translated_text, detected_language)}).
+    # The source is extracted once and, with a detect_fn, its language detected once; the
+    # translations then run concurrently on the translation pool, sharing translate_fn's cache.
+    def submit_many(self, source, target_languages, sha256=None):
+        result = Future()
+        context = contextvars.copy_context()
+        target_languages = list(dict.fromkeys(target_languages))
+
+        def on_text(text_future):
+            self.translate_pool.submit(context.run, self._fan_out, text_future.result(), target_languages, result)
+
+        self._extract(source, sha256, context).add_done_callback(on_text)
+        return result
+
+    def _fan_out(self, original_text, target_languages, result):
+        if not target_languages:
+            result.set_result((original_text, {}))
+            return
+        options = {}
+        if self.detect_fn is not None and original_text and not original_text.startswith(("Error", "No text found", "Unsupported file format")):
+            try:
+                options['detection'] = self.detect_fn(original_text)
+            except Exception:
+                # translate_fn falls back to detecting on its own
+                options = {}
+
+        translations = {}
+        lock = threading.Lock()
+        remaining = [len(target_languages)]
+
+        def on_translated(target_language, future):
+            try:
+                outcome = future.result()
+            except Exception as e:
+                outcome = (f"Error during translation: {str(e)}", "N/A")
+            with lock:
+                translations[target_language] = outcome
+                remaining[0] -= 1
+                done = remaining[0] == 0
+            if done:
+                result.set_result((original_text, {language: translations[language] for language in target_languages}))
+
+        for target_language in target_languages:
+            # One context per task: a context cannot be entered by several threads at once
+            future = self.translate_pool.submit(contextvars.copy_context().run, self.translate_fn, original_text, target_language, **options)
+            future.add_done_callback(lambda f, language=target_language: on_translated(language, f))
+
+    # Function to process a batch and return results in upload order
+    def run(self, sources, target_language, hashes=None):
+        hashes = hashes or [None] * len(sources)
+        futures = [self.submit(source, target_language, sha256) for source, sha256 in zip(sources, hashes)]
+        return [future.result() for future in futures]
+
+    # Function to process a batch into several languages; returns (original_text, translations) in upload order
+    def run_many(self, sources, target_languages, hashes=None):
+        hashes = hashes or [None] * len(sources)
+        futures = [self.submit_many(source, target_languages, sha256) for source, sha256 in zip(sources, hashes)]
+        return [future.result() for future in futures]
+
+    # Function to yield (index, result) pairs as soon as each file is done
+    def iter_completed(self, sources, target_language, hashes=None):
+        hashes = hashes or [None] * len(sources)
+        futures = {self.submit(source, target_language, sha256): i for i, (source, sha256) in enumerate(zip(sources, hashes))}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+    # Function to yield (index, (original_text, translations)) pairs as each file is done in every language
+    def iter_completed_many(self, sources, target_languages, hashes=None):
+        hashes = hashes or [None] * len(sources)
+        futures = {self.submit_many(source, target_languages, sha256): i for i, (source, sha256) in enumerate(zip(sources, hashes))}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+    def shutdown(self):
+        self.extract_pool.shutdown(wait=False, cancel_futures=True)
+        self.translate_pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _copy_result(source, target):
+    try:
+        target.set_result(source.result())
+    except Exception as e:
+        target.set_exception(e)
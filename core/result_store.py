@@ -0,0 +1,140 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from .storage import DB_PATH, get_connection, transaction
+
+# Results stay available for this long after their last use
+RESULT_TTL = 24 * 60 * 60
+MEMORY_SIZE = 64
+DOWNLOAD_CHUNK_CHARS = 64 * 1024
+PURGE_INTERVAL = 100
+
+FIELDS = ('filename', 'original_text', 'translated_text', 'detected_language', 'target_language')
+
+
+# Server-side store for per-session translation results, keyed by an opaque id that
+# is all the client keeps. Recently used result sets are held in an in-memory LRU
+# in front of the SQLite results table.
+class ResultStore:
+    def __init__(self, db_path=DB_PATH, memory_size=MEMORY_SIZE, ttl=RESULT_TTL):
+        self.db_path = db_path
+        self.memory_size = memory_size
+        self.ttl = ttl
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes_since_purge = 0
+
+    def _remember(self, store_id, results):
+        with self._lock:
+            self._memory[store_id] = results
+            self._memory.move_to_end(store_id)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def _write(self, store_id, rows):
+        expires_at = time.time() + self.ttl
+        with transaction(self.db_path) as c:
+            c.executemany('''INSERT OR REPLACE INTO results (store_id, position, filename, original_text, translated_text, detected_language,
+                                                           target_language, expires_at)
+                             VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                          [(store_id, position) + tuple(result.get(field) for field in FIELDS) + (expires_at,) for position, result in rows])
+            c.execute('UPDATE results SET expires_at = ? WHERE store_id = ?', (expires_at, store_id))
+            c.execute('UPDATE result_sources SET expires_at = ? WHERE store_id = ?', (expires_at, store_id))
+        with self._lock:
+            self._writes_since_purge += 1
+            should_purge = self._writes_since_purge >= PURGE_INTERVAL
+            if should_purge:
+                self._writes_since_purge = 0
+        if should_purge:
+            self.purge()
+
+    # Function to store a list of result dicts; returns the new store id.
+    # sources optionally maps positions to the original file bytes, kept for document downloads.
+    # A file translated into several languages only needs its bytes at its first position.
+    def create(self, results, sources=None):
+        store_id = uuid.uuid4().hex
+        results = [dict(result) for result in results]
+        if sources:
+            with transaction(self.db_path) as c:
+                c.executemany('INSERT OR REPLACE INTO result_sources (store_id, position, data, expires_at) VALUES (?, ?, ?, ?)',
+                              [(store_id, position, data, time.time() + self.ttl) for position, data in sources.items()])
+        self._write(store_id, list(enumerate(results)))
+        self._remember(store_id, results)
+        return store_id
+
+    # Function to get all results of a store id, or [] when unknown or expired
+    def get(self, store_id):
+        if not store_id:
+            return []
+        with self._lock:
+            results = self._memory.get(store_id)
+            if results is not None:
+                self._memory.move_to_end(store_id)
+                return [dict(result) for result in results]
+        c = get_connection(self.db_path).cursor()
+        c.execute('''SELECT filename, original_text, translated_text, detected_language, target_language FROM results
+                     WHERE store_id = ? AND expires_at > ? ORDER BY position''', (store_id, time.time()))
+        results = [dict(zip(FIELDS, row)) for row in c.fetchall()]
+        if results:
+            self._remember(store_id, results)
+        return [dict(result) for result in results]
+
+    # Function to replace one result, or append it when position is None; returns its position
+    def put(self, store_id, result, position=None):
+        results = self.get(store_id)
+        if position is None:
+            position = len(results)
+            results.append(dict(result))
+        else:
+            results[position] = dict(result)
+        self._write(store_id, [(position, results[position])])
+        self._remember(store_id, results)
+        return position
+
+    # Function to stream one translated text in encoded chunks. The text is read once and
+    # sliced here: substr() on a TEXT value decodes the whole value on every call, which
+    # made chunked reads quadratic in the text length.
+    def iter_translated(self, store_id, position, chunk_chars=DOWNLOAD_CHUNK_CHARS):
+        row = get_connection(self.db_path).execute('''SELECT translated_text FROM results
+                                                       WHERE store_id = ? AND position = ? AND expires_at > ?''',
+                                                    (store_id, position, time.time())).fetchone()
+        if row is None or not row[0]:
+            return
+        text = row[0]
+        for offset in range(0, len(text), chunk_chars):
+            yield text[offset:offset + chunk_chars].encode('utf-8')
+
+    # Function to get the rendered translated document of one result, or None
+    def get_document(self, store_id, position):
+        row = get_connection(self.db_path).execute('SELECT document FROM results WHERE store_id = ? AND position = ? AND expires_at > ?',
+                                                   (store_id, position, time.time())).fetchone()
+        return row[0] if row else None
+
+    # Function to keep the rendered translated document of one result until the result expires
+    def put_document(self, store_id, position, document):
+        with transaction(self.db_path) as c:
+            c.execute('UPDATE results SET document = ? WHERE store_id = ? AND position = ?', (document, store_id, position))
+
+    # Function to get (filename, has_translation, target_language) for one result without loading its texts
+    def describe(self, store_id, position):
+        row = get_connection(self.db_path).execute('''SELECT filename, translated_text IS NOT NULL, target_language FROM results
+                                                       WHERE store_id = ? AND position = ? AND expires_at > ?''',
+                                                    (store_id, position, time.time())).fetchone()
+        return row
+
+    # Function to get the original file bytes of one result, or None. Falls back to the
+    # nearest earlier result of the same file, where multi-language uploads keep them.
+    def get_source(self, store_id, position):
+        row = get_connection(self.db_path).execute('''SELECT s.data FROM result_sources s
+                                                       JOIN results r ON r.store_id = s.store_id AND r.position = s.position
+                                                       JOIN results current ON current.store_id = s.store_id AND current.position = ?
+                                                       WHERE s.store_id = ? AND s.position <= ? AND r.filename = current.filename
+                                                       AND s.expires_at > ? ORDER BY s.position DESC LIMIT 1''',
+                                                    (position, store_id, position, time.time())).fetchone()
+        return row[0] if row else None
+
+    def purge(self):
+        with transaction(self.db_path) as c:
+            c.execute('DELETE FROM results WHERE expires_at <= ?', (time.time(),))
+            c.execute('DELETE FROM result_sources WHERE expires_at <= ?', (time.time(),))
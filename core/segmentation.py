@@ -0,0 +1,141 @@
+import os
+import re
+import zlib
+from collections import Counter
+
+# Segment and batch limits (characters); googletrans rejects payloads over ~5000 chars
+SEGMENT_SIZE = int(os.environ.get('TRANSLATE_SEGMENT_SIZE', 1500))
+BATCH_CHARS = int(os.environ.get('TRANSLATE_BATCH_CHARS', 4500))
+BATCH_ITEMS = int(os.environ.get('TRANSLATE_BATCH_ITEMS', 25))
+
+# Separators tried in order when a piece is still too long: lines, then sentences
+_SPLIT_PATTERNS = [
+    re.compile(r'(\n)'),
+    re.compile(r'(?<=[.!?;。！？])(\s+)'),
+]
+_PARAGRAPH_PATTERN = re.compile(r'(\n[ \t]*\n\s*)')
+
+
+def _pairs(text, pattern):
+    parts = pattern.split(text)
+    return list(zip(parts[0::2], parts[1::2] + ['']))
+
+
+def _hard_split(text, separator, max_chars):
+    pieces = []
+    while len(text) > max_chars:
+        cut = text.rfind(' ', 0, max_chars)
+        if cut <= 0:
+            pieces.append((text[:max_chars], ''))
+            text = text[max_chars:]
+        else:
+            pieces.append((text[:cut], ' '))
+            text = text[cut + 1:]
+    pieces.append((text, separator))
+    return pieces
+
+
+# Function to cut text longer than max_chars into (piece, separator) pairs at lines,
+# then sentences, then words; split_segments packs the pieces back together
+def _split_piece(text, separator, max_chars, level=0):
+    if len(text) <= max_chars:
+        return [(text, separator)]
+    if level == len(_SPLIT_PATTERNS):
+        return _hard_split(text, separator, max_chars)
+    pairs = _pairs(text, _SPLIT_PATTERNS[level])
+    pieces = []
+    for piece, piece_sep in pairs[:-1] + [(pairs[-1][0], separator)]:
+        pieces.extend(_split_piece(piece, piece_sep, max_chars, level + 1))
+    return pieces
+
+
+# Function to decide from a piece's own content whether a segment ends after it; a piece
+# of n characters is picked with probability n / target, so segments average target characters
+def _is_boundary(piece, target):
+    return zlib.crc32(piece.encode('utf-8')) * target < len(piece) << 32
+
+
+# Function to split text into (segment, separator) pairs; ''.join(seg + sep) rebuilds the text.
+# Paragraphs (and the lines or sentences of longer ones) are packed into segments of up to
+# max_chars, since googletrans sends one request per segment. Segments end after pieces
+# picked by _is_boundary rather than at a running offset, so an edit or insertion only
+# invalidates the segment it falls in and the text after it still hits the cache.
+def split_segments(text, max_chars=SEGMENT_SIZE):
+    leading = text[:len(text) - len(text.lstrip())]
+    segments = [('', leading)] if leading else []
+    current, current_sep = '', None
+    for paragraph, separator in _pairs(text[len(leading):], _PARAGRAPH_PATTERN):
+        for piece, piece_sep in _split_piece(paragraph, separator, max_chars):
+            if current_sep is not None and len(current) + len(current_sep) + len(piece) > max_chars:
+                segments.append((current, current_sep))
+                current_sep = None
+            current = piece if current_sep is None else current + current_sep + piece
+            current_sep = piece_sep
+            if _is_boundary(piece, max_chars * 2 // 3):
+                segments.append((current, current_sep))
+                current_sep = None
+    if current_sep is not None:
+        segments.append((current, current_sep))
+    return segments
+
+
+# Function to group segment texts into batches bounded by total size and item count
+def batch_segments(texts, max_chars=BATCH_CHARS, max_items=BATCH_ITEMS):
+    batch, size = [], 0
+    for text in texts:
+        if batch and (size + len(text) > max_chars or len(batch) >= max_items):
+            yield batch
+            batch, size = [], 0
+        batch.append(text)
+        size += len(text)
+    if batch:
+        yield batch
+
+
+# Function to translate many texts at once: their segments are pooled, deduplicated
+# and looked up in the cache, so only unique misses reach the backend, in as few
+# batches as the limits allow. translate_batch(texts, target_language) must return a
+# list of (translated_text, detected_language). Returns one (translated_text,
+# detected_language) per text, the language weighted by segment length.
+def translate_texts(texts, target_language, translate_batch, cache=None, max_chars=SEGMENT_SIZE):
+    split = [split_segments(text, max_chars) for text in texts]
+    translations = {}
+    pending = []
+    seen = set()
+    for segments in split:
+        for segment, _ in segments:
+            if not segment.strip() or segment in seen:
+                continue
+            seen.add(segment)
+            cached = cache.get(segment, target_language) if cache is not None else None
+            if cached is not None:
+                translations[segment] = cached
+            else:
+                pending.append(segment)
+
+    for batch in batch_segments(pending):
+        results = translate_batch(batch, target_language)
+        for segment, result in zip(batch, results):
+            translations[segment] = result
+            if cache is not None:
+                cache.put(segment, target_language, result[0], result[1])
+
+    outputs = []
+    for segments in split:
+        weights = Counter()
+        output = []
+        for segment, separator in segments:
+            if segment in translations:
+                translated, language = translations[segment]
+                weights[language] += len(segment)
+                output.append(translated)
+            else:
+                output.append(segment)
+            output.append(separator)
+        outputs.append((''.join(output), weights.most_common(1)[0][0] if weights else "Unknown"))
+    return outputs
+
+
+# Function to translate one text segment by segment, only sending cache misses to the backend
+def translate_segments(text, target_language, translate_batch, cache=None, max_chars=SEGMENT_SIZE):
+    return translate_texts([text], target_language, translate_batch, cache, max_chars)[0]
@@ -0,0 +1,277 @@
+import os
+import sqlite3
+import threading
+import logging
+from contextlib import contextmanager
+
+DB_PATH = os.environ.get('TRANSLATIONS_DB', 'translations.db')
+BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+
+logger = logging.getLogger(__name__)
+
+# Pragmas applied to every pooled connection. WAL lets readers run alongside the
+# single writer, and synchronous=NORMAL only fsyncs at checkpoints under WAL.
+PRAGMAS = [
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA cache_size = -16000',
+    'PRAGMA mmap_size = 134217728',
+]
+
+_local = threading.local()
+_migrated = set()
+_migrate_lock = threading.Lock()
+
+
+# Function to get this thread's pooled connection for a database, opening it on first use
+def get_connection(db_path=DB_PATH):
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(db_path)
+    if conn is None:
+        conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        _migrate(conn, db_path)
+        connections[db_path] = conn
+    return conn
+
+
+# Function to close this thread's pooled connections
+def close_connections():
+    for conn in getattr(_local, 'connections', {}).values():
+        conn.close()
+    _local.connections = {}
+
+
+# Context manager yielding a cursor inside a transaction that commits on success
+@contextmanager
+def transaction(db_path=DB_PATH):
+    conn = get_connection(db_path)
+    with conn:
+        yield conn.cursor()
+
+
+def _create_translations(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS translations
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  filename TEXT,
+                  original_text TEXT,
+                  translated_text TEXT,
+                  detected_language TEXT,
+                  target_language TEXT,
+                  timestamp TEXT)''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_translations_timestamp ON translations (timestamp)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_translations_filename ON translations (filename)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_translations_target_language ON translations (target_language)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_translations_detected_language ON translations (detected_language)')
+
+
+# Full-text index over both texts, kept in sync with triggers. Skipped when the
+# SQLite build has no FTS5; history search then falls back to LIKE.
+def _create_translations_fts(c):
+    try:
+        c.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'translations_fts'")
+        fts_exists = c.fetchone() is not None
+        c.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS translations_fts
+                     USING fts5(original_text, translated_text, content='translations', content_rowid='id')''')
+    except sqlite3.OperationalError as e:
+        logger.warning("FTS5 unavailable, history search will use LIKE: %s", e)
+        return
+    c.execute('''CREATE TRIGGER IF NOT EXISTS translations_fts_insert AFTER INSERT ON translations BEGIN
+                     INSERT INTO translations_fts (rowid, original_text, translated_text)
+                     VALUES (new.id, new.original_text, new.translated_text);
+                 END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS translations_fts_delete AFTER DELETE ON translations BEGIN
+                     INSERT INTO translations_fts (translations_fts, rowid, original_text, translated_text)
+                     VALUES ('delete', old.id, old.original_text, old.translated_text);
+                 END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS translations_fts_update AFTER UPDATE ON translations BEGIN
+                     INSERT INTO translations_fts (translations_fts, rowid, original_text, translated_text)
+                     VALUES ('delete', old.id, old.original_text, old.translated_text);
+                     INSERT INTO translations_fts (rowid, original_text, translated_text)
+                     VALUES (new.id, new.original_text, new.translated_text);
+                 END''')
+    if not fts_exists:
+        # Index rows written before the full-text table existed
+        c.execute("INSERT INTO translations_fts (translations_fts) VALUES ('rebuild')")
+
+
+def _create_translation_cache(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS translation_cache
+                 (key TEXT PRIMARY KEY,
+                  target_language TEXT,
+                  translated_text TEXT,
+                  detected_language TEXT,
+                  created_at REAL,
+                  accessed_at REAL)''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_translation_cache_accessed ON translation_cache (accessed_at)')
+
+
+def _create_jobs(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS jobs
+                 (id TEXT PRIMARY KEY,
+                  status TEXT,
+                  target_language TEXT,
+                  file_count INTEGER,
+                  created_at TEXT,
+                  updated_at TEXT)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS job_files
+                 (job_id TEXT,
+                  position INTEGER,
+                  filename TEXT,
+                  data BLOB,
+                  status TEXT,
+                  original_text TEXT,
+                  translated_text TEXT,
+                  detected_language TEXT,
+                  error TEXT,
+                  updated_at TEXT,
+                  PRIMARY KEY (job_id, position))''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_job_files_status ON job_files (status)')
+
+
+def _create_results(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS results
+                 (store_id TEXT,
+                  position INTEGER,
+                  filename TEXT,
+                  original_text TEXT,
+                  translated_text TEXT,
+                  detected_language TEXT,
+                  expires_at REAL,
+                  PRIMARY KEY (store_id, position))''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_results_expires ON results (expires_at)')
+
+
+def _create_batch_files(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS batch_files
+                 (sha256 TEXT,
+                  target_language TEXT,
+                  source_path TEXT,
+                  output_path TEXT,
+                  detected_language TEXT,
+                  completed_at REAL,
+                  PRIMARY KEY (sha256, target_language))''')
+
+
+def _create_extraction_cache(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS extraction_cache
+                 (key TEXT PRIMARY KEY,
+                  text TEXT,
+                  size INTEGER,
+                  created_at REAL,
+                  accessed_at REAL)''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_extraction_cache_accessed ON extraction_cache (accessed_at)')
+
+
+def _create_result_sources(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS result_sources
+                 (store_id TEXT,
+                  position INTEGER,
+                  data BLOB,
+                  expires_at REAL,
+                  PRIMARY KEY (store_id, position))''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_result_sources_expires ON result_sources (expires_at)')
+
+
+def _add_column(c, table, column, definition):
+    c.execute(f'PRAGMA table_info({table})')
+    if column not in [row[1] for row in c.fetchall()]:
+        c.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+
+# Multi-language jobs and results: every target of a job gets a job_translations row,
+# and results rows record the language they were translated into
+def _add_target_languages(c):
+    _add_column(c, 'jobs', 'target_languages', 'TEXT')
+    _add_column(c, 'results', 'target_language', 'TEXT')
+    c.execute('''CREATE TABLE IF NOT EXISTS job_translations
+                 (job_id TEXT,
+                  position INTEGER,
+                  target_language TEXT,
+                  translated_text TEXT,
+                  detected_language TEXT,
+                  PRIMARY KEY (job_id, position, target_language))''')
+
+
+# Job file leases: a running file records the worker process that claimed it and
+# when that claim lapses unless the owner keeps renewing it
+def _add_job_leases(c):
+    _add_column(c, 'job_files', 'owner', 'TEXT')
+    _add_column(c, 'job_files', 'lease_expires', 'REAL')
+
+
+# Rendered translated documents, kept next to the translation they belong to so a
+# download does not translate the document again; they expire with their row
+def _add_translated_documents(c):
+    _add_column(c, 'results', 'document', 'BLOB')
+    _add_column(c, 'job_translations', 'document', 'BLOB')
+
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version.
+# Steps use IF NOT EXISTS so databases created before versioning upgrade cleanly.
+# Append new steps to the end; never reorder or edit released ones.
+MIGRATIONS = [
+    _create_translations,
+    _create_translations_fts,
+    _create_translation_cache,
+    _create_jobs,
+    _create_results,
+    _create_batch_files,
+    _create_extraction_cache,
+    _create_result_sources,
+    _add_target_languages,
+    _add_job_leases,
+    _add_translated_documents,
+]
+
+
+def _migrate(conn, db_path):
+    with _migrate_lock:
+        if db_path in _migrated:
+            return
+        c = conn.cursor()
+        version = c.execute('PRAGMA user_version').fetchone()[0]
+        for number, step in enumerate(MIGRATIONS[version:], start=version + 1):
+            with conn:
+                step(c)
+                c.execute(f'PRAGMA user_version = {number}')
+            logger.info("Applied migration %d (%s) to %s", number, step.__name__, db_path)
+        _migrated.add(db_path)
+
+
+# Function to bring a database up to the latest schema version
+def migrate(db_path=DB_PATH):
+    get_connection(db_path)
+
+
+# Buffers rows for one INSERT statement and writes them in a single transaction,
+# so a whole upload batch costs one commit instead of one per row
+class BufferedWriter:
+    def __init__(self, sql, db_path=DB_PATH, max_rows=500):
+        self.sql = sql
+        self.db_path = db_path
+        self.max_rows = max_rows
+        self.rows = []
+
+    def add(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.max_rows:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        rows, self.rows = self.rows, []
+        with transaction(self.db_path) as c:
+            c.executemany(self.sql, rows)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
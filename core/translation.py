@@ -0,0 +1,70 @@
+import io
+import zipfile
+from . import metrics
+from .languages import LANGUAGES
+from .segmentation import translate_segments
+from .documents import translate_docx
+from .translator_client import get_client
+from .language_id import detect_language, same_language, SKIP_CONFIDENCE
+
+
+# Function to translate a batch of segments; the backend reports the source language per item
+def translate_batch(texts, target_language):
+    translated = get_client().translate_batch(texts, target_language)
+    return [(text, LANGUAGES.get(src, "Unknown") if src else "Unknown") for text, src in translated]
+
+
+# Function to translate text with language detection; returns (translated_text, detected_language).
+# detection is an optional (source_language, confidence) from detect_language, so text
+# translated into several languages is only detected once.
+def translate_text(text, target_language, cache=None, detection=None):
+    with metrics.timed('translate', target=target_language):
+        translated_text, detected_language = _translate_text(text, target_language, cache, detection)
+    if translated_text.startswith("Error during translation"):
+        metrics.inc('stage_errors_total', stage='translate')
+    elif translated_text is not text:
+        metrics.inc('characters_total', len(translated_text), kind='translated')
+    return translated_text, detected_language
+
+
+def _translate_text(text, target_language, cache, detection=None):
+    if not text or text.startswith("Error") or text.startswith("No text found"):
+        return text, "N/A"
+    source_language, confidence = detection or detect_language(text)
+    confident = source_language is not None and confidence >= SKIP_CONFIDENCE
+    # Already in the target language: nothing to send to the backend
+    if confident and same_language(source_language, target_language):
+        return text, LANGUAGES.get(source_language, "Unknown")
+    try:
+        translated_text, backend_language = translate_segments(text, target_language, translate_batch, cache)
+    except Exception as e:
+        return f"Error during translation: {str(e)}", "N/A"
+    return translated_text, LANGUAGES.get(source_language, "Unknown") if confident else backend_language
+
+
+# Function to translate a DOCX into a copy with the same structure and formatting;
+# returns (docx_bytes, detected_language)
+def translate_document(data, target_language, cache=None):
+    with metrics.timed('translate_document', target=target_language):
+        output, detected_language, _ = translate_docx(data, target_language, translate_batch, cache)
+    return output, detected_language
+
+
+# Function to pack (filename, target_language, translated_text) entries into a ZIP with
+# one folder per language
+def zip_translations(entries):
+    output = io.BytesIO()
+    names = set()
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for filename, target_language, translated_text in entries:
+            base = f"{target_language or 'translated'}/translated_{filename}"
+            name = f"{base}.txt"
+            counter = 1
+            # Files uploaded twice under the same name get numbered
+            while name in names:
+                counter += 1
+                name = f"{base} ({counter}).txt"
+            names.add(name)
+            archive.writestr(name, translated_text)
+    output.seek(0)
+    return output
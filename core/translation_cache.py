@@ -0,0 +1,132 @@
+import hashlib
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from .storage import DB_PATH, transaction
+
+# Default limits for the cache tiers
+MEMORY_SIZE = 1024
+MAX_ENTRIES = 100000
+TTL_SECONDS = 30 * 24 * 60 * 60
+PRUNE_INTERVAL = 500
+
+
+# Function to normalize text so trivial whitespace differences share a cache entry
+def normalize_text(text):
+    text = unicodedata.normalize('NFC', text)
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return '\n'.join(line.rstrip() for line in text.split('\n')).strip()
+
+
+# Function to build the content-addressed cache key
+def make_key(text, target_language):
+    normalized = normalize_text(text)
+    return hashlib.sha256(f"{target_language}\0{normalized}".encode('utf-8')).hexdigest()
+
+
+# Two-tier translation cache: an in-process LRU in front of a SQLite table
+class TranslationCache:
+    def __init__(self, db_path=DB_PATH, memory_size=MEMORY_SIZE, max_entries=MAX_ENTRIES, ttl=TTL_SECONDS):
+        self.db_path = db_path
+        self.memory_size = memory_size
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._puts_since_prune = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _remember(self, key, value, created_at):
+        with self._lock:
+            self._memory[key] = (value, created_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def _expired(self, created_at, now):
+        return self.ttl is not None and now - created_at > self.ttl
+
+    # Returns (translated_text, detected_language) or None on a miss
+    def get(self, text, target_language):
+        key = make_key(text, target_language)
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if not self._expired(created_at, now):
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return value
+                del self._memory[key]
+
+        with transaction(self.db_path) as c:
+            c.execute('SELECT translated_text, detected_language, created_at FROM translation_cache WHERE key = ?', (key,))
+            row = c.fetchone()
+            if row is not None and self._expired(row[2], now):
+                c.execute('DELETE FROM translation_cache WHERE key = ?', (key,))
+                row = None
+            elif row is not None:
+                c.execute('UPDATE translation_cache SET accessed_at = ? WHERE key = ?', (now, key))
+
+        if row is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        value = (row[0], row[1])
+        self._remember(key, value, row[2])
+        with self._lock:
+            self.disk_hits += 1
+        return value
+
+    def put(self, text, target_language, translated_text, detected_language):
+        key = make_key(text, target_language)
+        now = time.time()
+        value = (translated_text, detected_language)
+        self._remember(key, value, now)
+
+        with transaction(self.db_path) as c:
+            c.execute('''INSERT OR REPLACE INTO translation_cache (key, target_language, translated_text, detected_language, created_at, accessed_at)
+                         VALUES (?, ?, ?, ?, ?, ?)''',
+                      (key, target_language, translated_text, detected_language, now, now))
+
+        with self._lock:
+            self._puts_since_prune += 1
+            should_prune = self._puts_since_prune >= PRUNE_INTERVAL
+            if should_prune:
+                self._puts_since_prune = 0
+        if should_prune:
+            self.prune()
+
+    # Function to drop expired rows and trim the table down to max_entries
+    def prune(self):
+        with transaction(self.db_path) as c:
+            if self.ttl is not None:
+                c.execute('DELETE FROM translation_cache WHERE created_at < ?', (time.time() - self.ttl,))
+            if self.max_entries is not None:
+                c.execute('''DELETE FROM translation_cache WHERE key IN
+                             (SELECT key FROM translation_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)''',
+                          (self.max_entries,))
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        with transaction(self.db_path) as c:
+            c.execute('DELETE FROM translation_cache')
+
+    def stats(self):
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': hits / total if total else 0.0,
+                'memory_entries': len(self._memory),
+            }
@@ -0,0 +1,243 @@
+import os
+import queue
+import random
+import threading
+import time
+import logging
+
+# Client settings; TRANSLATION_BACKEND=fake runs fully offline
+TRANSLATION_BACKEND = os.environ.get('TRANSLATION_BACKEND', 'google')
+BACKEND_POOL_SIZE = int(os.environ.get('TRANSLATE_POOL_SIZE', 8))
+RATE_LIMIT = float(os.environ.get('TRANSLATE_RATE_LIMIT', 5.0))
+RATE_BURST = int(os.environ.get('TRANSLATE_RATE_BURST', 10))
+MAX_RETRIES = int(os.environ.get('TRANSLATE_MAX_RETRIES', 4))
+RETRY_BASE_DELAY = float(os.environ.get('TRANSLATE_RETRY_BASE_DELAY', 0.5))
+RETRY_MAX_DELAY = float(os.environ.get('TRANSLATE_RETRY_MAX_DELAY', 8.0))
+BREAKER_THRESHOLD = int(os.environ.get('TRANSLATE_BREAKER_THRESHOLD', 5))
+BREAKER_RESET = float(os.environ.get('TRANSLATE_BREAKER_RESET', 30.0))
+
+logger = logging.getLogger(__name__)
+
+
+class TranslationError(Exception):
+    pass
+
+
+# Raised without calling the backend while the circuit breaker is open
+class BackendUnavailable(TranslationError):
+    pass
+
+
+# Interface for translation backends. translate_batch returns one
+# (translated_text, source_language_code) pair per input text, so detection
+# comes back with the translation instead of needing a second request.
+class TranslationBackend:
+    name = 'base'
+
+    def translate_batch(self, texts, target_language):
+        raise NotImplementedError
+
+    # Function to count the upstream requests one translate_batch call makes
+    def request_cost(self, texts):
+        return 1
+
+
+# googletrans backend keeping a pool of long-lived Translator instances so their
+# HTTP sessions (and connections) are reused across calls
+class GoogleBackend(TranslationBackend):
+    name = 'google'
+
+    def __init__(self, pool_size=BACKEND_POOL_SIZE):
+        from googletrans import Translator
+        self._factory = Translator
+        self._pool = queue.LifoQueue()
+        for _ in range(pool_size):
+            self._pool.put(Translator())
+
+    def translate_batch(self, texts, target_language):
+        translator = self._pool.get()
+        try:
+            translated = translator.translate(list(texts), dest=target_language)
+        except Exception:
+            # A failed session may be left throttled or half-closed; replace it
+            translator = self._factory()
+            raise
+        finally:
+            self._pool.put(translator)
+        return [(t.text, t.src) for t in translated]
+
+    # googletrans sends one HTTP request per item of a list, so a batch costs
+    # as many requests as it has texts
+    def request_cost(self, texts):
+        return max(1, len(texts))
+
+
+# Offline backend for tests and throughput runs: tags each text with the target
+# language after an optional simulated latency, and can fail at a given rate
+class FakeBackend(TranslationBackend):
+    name = 'fake'
+
+    def __init__(self, latency=0.0, failure_rate=0.0, source_language='en'):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.source_language = source_language
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def translate_batch(self, texts, target_language):
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise TranslationError("Simulated backend failure")
+        return [(f"[{target_language}] {text}", self.source_language) for text in texts]
+
+
+BACKENDS = {
+    'google': GoogleBackend,
+    'fake': FakeBackend,
+}
+
+
+# Token bucket allowing `rate` requests per second with bursts of up to `capacity`.
+# A request for more tokens than `capacity` waits for a full bucket and leaves
+# it in debt, so large batches still average out to `rate`
+class TokenBucket:
+    def __init__(self, rate=RATE_LIMIT, capacity=RATE_BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        if not self.rate:
+            return
+        needed = min(tokens, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= needed:
+                    self._tokens -= tokens
+                    return
+                wait = (needed - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# Circuit breaker: after `threshold` consecutive failures calls are rejected for
+# `reset_timeout` seconds, then a single trial call decides whether to close again
+class CircuitBreaker:
+    def __init__(self, threshold=BREAKER_THRESHOLD, reset_timeout=BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return 'closed'
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                return 'half-open'
+            return 'open'
+
+    def before_call(self):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.reset_timeout or self._trial_running:
+                raise BackendUnavailable("Translation backend unavailable, try again later")
+            self._trial_running = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.threshold:
+                if self.opened_at is None or self._trial_running:
+                    logger.warning("Translation circuit opened after %d failures", self.failures)
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+
+# Long-lived client wrapping a backend with rate limiting, jittered exponential
+# retry and a circuit breaker
+class TranslatorClient:
+    def __init__(self, backend, rate_limiter=None, breaker=None, max_retries=MAX_RETRIES,
+                 base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY):
+        self.backend = backend
+        self.rate_limiter = rate_limiter if rate_limiter is not None else TokenBucket()
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.requests = 0
+        self.retries = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    # Function to translate a batch; returns (translated_text, source_language_code) pairs
+    def translate_batch(self, texts, target_language):
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            # Every attempt, retries included, pays for all the requests it sends
+            self.rate_limiter.acquire(self.backend.request_cost(texts))
+            self._count('requests')
+            try:
+                results = self.backend.translate_batch(texts, target_language)
+            except Exception as e:
+                self._count('errors')
+                self.breaker.record_failure()
+                if attempt >= self.max_retries:
+                    raise TranslationError(f"Translation failed after {attempt + 1} attempts: {e}") from e
+                # Full jitter keeps concurrent workers from retrying in lockstep
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                logger.info("Translation attempt %d failed (%s), retrying in %.2fs", attempt + 1, e, delay)
+                attempt += 1
+                self._count('retries')
+                time.sleep(delay)
+                continue
+            self.breaker.record_success()
+            return results
+
+    def stats(self):
+        with self._lock:
+            return {'backend': self.backend.name, 'requests': self.requests, 'retries': self.retries,
+                    'errors': self.errors, 'circuit': self.breaker.state}
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+# Function to get the shared client, building the configured backend on first use
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = TranslatorClient(BACKENDS[TRANSLATION_BACKEND]())
+        return _client
+
+
+# Function to replace the shared client (benchmarks, offline runs); returns the previous one
+def set_client(client):
+    global _client
+    with _client_lock:
+        previous, _client = _client, client
+        return previous
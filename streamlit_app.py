@@ -1,112 +1,36 @@
 import streamlit as st
-import pytesseract
-import pdfplumber
-from docx import Document
-from PIL import Image, ImageEnhance
-from googletrans import Translator, LANGUAGES
-import os
-import sqlite3
-from datetime import datetime
-
-# Set Tesseract path (uncomment if needed)
-# pytesseract.pytesseract.tesseract_cmd = '/opt/homebrew/bin/tesseract'
-
-def preprocess_image(image_path):
-    try:
-        img = Image.open(image_path)
-        img = img.convert('L')
-        enhancer = ImageEnhance.Contrast(img)
-        img = enhancer.enhance(2.0)
-        temp_path = os.path.join('Uploads', f"processed_{os.path.basename(image_path)}")
-        img.save(temp_path)
-        return temp_path
-    except Exception as e:
-        return image_path
-
-def extract_text(file_path):
-    ext = os.path.splitext(file_path)[1].lower()
-    if ext in ['.jpg', '.jpeg', '.png']:
-        try:
-            processed_path = preprocess_image(file_path)
-            text = pytesseract.image_to_string(Image.open(processed_path))
-            if processed_path != file_path:
-                os.remove(processed_path)
-            return text if text.strip() else "No text found in image"
-        except Exception as e:
-            return f"Error processing image: {str(e)}"
-    elif ext == '.pdf':
-        try:
-            with pdfplumber.open(file_path) as pdf:
-                text = ''
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + '\n'
-                return text if text.strip() else "No text found in PDF"
-        except Exception as e:
-            return f"Error processing PDF: {str(e)}"
-    elif ext in ['.doc', '.docx']:
-        try:
-            doc = Document(file_path)
-            text = '\n'.join([para.text for para in doc.paragraphs if para.text.strip()])
-            return text if text.strip() else "No text found in DOC"
-        except Exception as e:
-            return f"Error processing DOC: {str(e)}"
-    elif ext == '.txt':
-        try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                text = file.read()
-                return text if text.strip() else "No text found in TXT"
-        except Exception as e:
-            return f"Error processing TXT: {str(e)}"
-    else:
-        return "Unsupported file format"
-
-def translate_text(text, target_language):
-    if not text or text.startswith("Error") or text.startswith("No text found"):
-        return text, "N/A"
-    try:
-        translator = Translator()
-        detected = translator.detect(text)
-        language = LANGUAGES.get(detected.lang, "Unknown") if detected.lang else "Unknown"
-        translated = translator.translate(text, dest=target_language)
-        return translated.text, language
-    except Exception as e:
-        return f"Error during translation: {str(e)}", "N/A"
-
-def init_db():
-    conn = sqlite3.connect('translations.db')
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS translations
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  filename TEXT,
-                  original_text TEXT,
-                  translated_text TEXT,
-                  detected_language TEXT,
-                  target_language TEXT,
-                  timestamp TEXT)''')
-    conn.commit()
-    conn.close()
-
-init_db()
-
-def save_to_history(filename, original_text, translated_text, detected_language, target_language):
-    conn = sqlite3.connect('translations.db')
-    c = conn.cursor()
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    c.execute('''INSERT INTO translations (filename, original_text, translated_text, detected_language, target_language, timestamp)
-                 VALUES (?, ?, ?, ?, ?, ?)''',
-              (filename, original_text, translated_text, detected_language, LANGUAGES.get(target_language, "Unknown"), timestamp))
-    conn.commit()
-    conn.close()
-
-def get_history():
-    conn = sqlite3.connect('translations.db')
-    c = conn.cursor()
-    c.execute('SELECT timestamp, filename, detected_language, target_language, original_text, translated_text FROM translations ORDER BY timestamp DESC')
-    history = [{'timestamp': row[0], 'filename': row[1], 'detected_language': row[2], 'target_language': row[3], 'original_text': row[4], 'translated_text': row[5]} for row in c.fetchall()]
-    conn.close()
-    return history
+from core.languages import LANGUAGES
+from core.translation_cache import TranslationCache
+from core.extraction_cache import ExtractionCache
+from core import translation
+from core.extraction import extract_text, supported_extensions
+from core.language_id import detect_language
+from core.documents import supports_round_trip
+from core.pipeline import FilePipeline
+from core.ingest import ingest_files, UploadTooLarge
+from core.history import init_db, save_to_history, get_history, get_history_entry, history_batch
+from core.storage import close_connections
+
+# Keep one translation cache across Streamlit reruns
+@st.cache_resource
+def get_translation_cache():
+    return TranslationCache()
+
+# Keep the worker pools alive across reruns instead of respawning them per upload
+@st.cache_resource
+def get_pipeline():
+    return FilePipeline(extract_text, translate_text, extraction_cache=ExtractionCache(), detect_fn=detect_language)
+
+def translate_text(text, target_language, detection=None):
+    return translation.translate_text(text, target_language, get_translation_cache(), detection)
+
+# Set up the database once per server process rather than on every rerun
+@st.cache_resource
+def setup_database():
+    init_db()
+    return True
+
+setup_database()
 
 st.title("File Translator")
 
@@ -120,59 +44,95 @@ else:
 # Initialize session state
 if 'results' not in st.session_state:
     st.session_state.results = []
-if 'target_language' not in st.session_state:
-    st.session_state.target_language = None
 
-uploaded_files = st.file_uploader("Upload files", type=['jpg', 'jpeg', 'png', 'pdf', 'doc', 'docx', 'txt'], accept_multiple_files=True)
+uploaded_files = st.file_uploader("Upload files", type=[ext.lstrip('.') for ext in supported_extensions()], accept_multiple_files=True)
 language_options = [(code, name) for code, name in LANGUAGES.items()]
 language = st.selectbox("Select Target Language", options=[name for _, name in language_options], format_func=lambda x: x)
 language_code = next((code for code, name in language_options if name == language), None)
+# Every file is extracted once, then translated into all selected languages concurrently
+extra_languages = st.multiselect("Also translate into", options=[code for code, _ in language_options if code != language_code],
+                                 format_func=lambda code: LANGUAGES[code])
+target_languages = [language_code] + extra_languages
 
-# Process uploaded files
+# Process uploaded files, showing each file's result as soon as it is ready
 if uploaded_files and language_code:
-    with st.spinner("Processing files..."):
-        st.session_state.results = []
-        for uploaded_file in uploaded_files:
-            if uploaded_file and uploaded_file.name:
-                file_path = f"Uploads/{uploaded_file.name}"
-                with open(file_path, "wb") as f:
-                    f.write(uploaded_file.getbuffer())
-                if file_path.endswith(('.jpg', '.jpeg', '.png')):
-                    st.image(file_path, caption=f"Uploaded Image: {uploaded_file.name}")
-                text = extract_text(file_path)
-                translated_text, detected_language = translate_text(text, language_code)
-                st.session_state.results.append({
-                    'filename': uploaded_file.name,
-                    'original_text': text,
-                    'translated_text': translated_text,
-                    'detected_language': detected_language
-                })
-                save_to_history(uploaded_file.name, text, translated_text, detected_language, language_code)
-                try:
-                    os.remove(file_path)
-                except:
-                    pass
-        st.session_state.target_language = language_code
+    st.session_state.results = []
+    valid = [uploaded_file for uploaded_file in uploaded_files if uploaded_file and uploaded_file.name]
+    for uploaded_file in valid:
+        uploaded_file.seek(0)
+    # Read uploads in bounded chunks; only PDFs are spooled to (uniquely named) temp files
+    try:
+        uploads = ingest_files([(uploaded_file.name, uploaded_file) for uploaded_file in valid])
+    except UploadTooLarge as e:
+        st.error(str(e))
+        uploads = []
+    for upload in uploads:
+        if upload.filename.lower().endswith(('.jpg', '.jpeg', '.png')):
+            st.image(upload.data, caption=f"Uploaded Image: {upload.filename}")
+    if uploads:
+        progress = st.progress(0.0, text="Processing files...")
+        placeholders = [st.empty() for _ in uploads]
+        for upload, placeholder in zip(uploads, placeholders):
+            placeholder.info(f"{upload.filename}: processing...")
+        outputs = [None] * len(uploads)
+        sources = [upload.source() for upload in uploads]
+        hashes = [upload.sha256 for upload in uploads]
+        for done, (index, output) in enumerate(get_pipeline().iter_completed_many(sources, target_languages, hashes), start=1):
+            outputs[index] = output
+            text, translations = output
+            translated_text, detected_language = translations[language_code]
+            with placeholders[index].container():
+                st.success(f"{uploads[index].filename}: done in {len(translations)} language(s) (detected language: {detected_language})")
+                st.text(translated_text[:500])
+            progress.progress(done / len(uploads), text=f"Processed {done} of {len(uploads)} files")
+        # The full, editable results are rendered below once every file is done
+        progress.empty()
+        for placeholder in placeholders:
+            placeholder.empty()
+        with history_batch():
+            for upload, (text, translations) in zip(uploads, outputs):
+                # Original bytes of documents that can be written back with their layout
+                source = upload.read() if supports_round_trip(upload.filename) else None
+                for target_language, (translated_text, detected_language) in translations.items():
+                    st.session_state.results.append({
+                        'filename': upload.filename,
+                        'original_text': text,
+                        'translated_text': translated_text,
+                        'detected_language': detected_language,
+                        'target_language': target_language,
+                        'source': source
+                    })
+                    save_to_history(upload.filename, text, translated_text, detected_language, target_language)
+                upload.cleanup()
 
 # Display results
 if st.session_state.results:
+    st.download_button(
+        label="Download all (ZIP)",
+        data=translation.zip_translations([(result['filename'], result['target_language'], result['translated_text'])
+                                           for result in st.session_state.results]).getvalue(),
+        file_name="translations.zip",
+        mime="application/zip",
+        key="download_all"
+    )
     for i, result in enumerate(st.session_state.results):
         st.write(f"**File: {result['filename']}**")
+        st.write(f"**Target Language**: {LANGUAGES.get(result['target_language'], result['target_language'])}")
         st.write(f"**Detected Language**: {result['detected_language']}")
         st.write("**Extracted Text:**")
         new_text = st.text_area(f"Original_{i}", result['original_text'], height=200, key=f"original_{i}")
         if new_text != result['original_text']:
             st.session_state.results[i]['original_text'] = new_text
-            new_translated, new_detected = translate_text(new_text, st.session_state.target_language)
+            new_translated, new_detected = translate_text(new_text, result['target_language'])
             st.session_state.results[i]['translated_text'] = new_translated
             st.session_state.results[i]['detected_language'] = new_detected
-            save_to_history(result['filename'], new_text, new_translated, new_detected, st.session_state.target_language)
+            save_to_history(result['filename'], new_text, new_translated, new_detected, result['target_language'])
         if st.button("Reload Translation", key=f"reload_{i}"):
             with st.spinner("Retranslating..."):
-                new_translated, new_detected = translate_text(st.session_state.results[i]['original_text'], st.session_state.target_language)
+                new_translated, new_detected = translate_text(st.session_state.results[i]['original_text'], result['target_language'])
                 st.session_state.results[i]['translated_text'] = new_translated
                 st.session_state.results[i]['detected_language'] = new_detected
-                save_to_history(result['filename'], st.session_state.results[i]['original_text'], new_translated, new_detected, st.session_state.target_language)
+                save_to_history(result['filename'], st.session_state.results[i]['original_text'], new_translated, new_detected, result['target_language'])
         st.write("**Translated Text:**")
         st.text_area(f"Translated_{i}", result['translated_text'], height=200, key=f"translated_{i}")
         st.download_button(
@@ -182,12 +142,32 @@ if st.session_state.results:
             mime="text/plain",
             key=f"download_{i}"
         )
-
-# Display history
-history = get_history()
+        if result.get('source') is not None:
+            # Translating the document is a separate pass, so only do it on request
+            if st.button("Prepare translated DOCX", key=f"prepare_docx_{i}"):
+                with st.spinner("Translating document..."):
+                    st.session_state.results[i]['document'] = translation.translate_document(
+                        result['source'], result['target_language'], get_translation_cache())[0]
+            if st.session_state.results[i].get('document') is not None:
+                st.download_button(
+                    label=f"Download translated {result['filename']}",
+                    data=st.session_state.results[i]['document'],
+                    file_name=f"translated_{result['filename']}",
+                    mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+                    key=f"download_docx_{i}"
+                )
+
+# Display history one page at a time; cursors of the pages already seen allow going back
+if 'history_cursors' not in st.session_state:
+    st.session_state.history_cursors = [None]
+st.write("**Translation History**")
+search = st.text_input("Search history", key="history_search")
+if st.session_state.get('history_last_search') != search:
+    st.session_state.history_cursors = [None]
+    st.session_state.history_last_search = search
+history, next_cursor = get_history(before=st.session_state.history_cursors[-1], search=search)
 if history:
-    st.write("**Translation History**")
-    history_df = st.dataframe([
+    st.dataframe([
         {
             'Timestamp': entry['timestamp'],
             'File Name': entry['filename'],
@@ -197,6 +177,26 @@ if history:
             'Translated Text': entry['translated_text']
         } for entry in history
     ])
+    newer_col, older_col = st.columns(2)
+    if len(st.session_state.history_cursors) > 1 and newer_col.button("Newer entries"):
+        st.session_state.history_cursors.pop()
+        st.rerun()
+    if next_cursor and older_col.button("Older entries"):
+        st.session_state.history_cursors.append(next_cursor)
+        st.rerun()
+    selected = st.selectbox("Open history entry", options=[None] + [entry['id'] for entry in history],
+                            format_func=lambda entry_id: "Select an entry" if entry_id is None else next(
+                                f"{entry['timestamp']} - {entry['filename']}" for entry in history if entry['id'] == entry_id))
+    if selected is not None:
+        entry = get_history_entry(selected)
+        if entry:
+            st.text_area("Full Original Text", entry['original_text'], height=200, key=f"history_original_{selected}")
+            st.text_area("Full Translated Text", entry['translated_text'], height=200, key=f"history_translated_{selected}")
+elif search:
+    st.write("No history entries match your search.")
 
 if not uploaded_files and not st.session_state.results:
-    st.error("Please upload at least one file to translate.")
\ No newline at end of file
+    st.error("Please upload at least one file to translate.")
+
+# Close this run's pooled SQLite connections; the next rerun gets a script thread of its own
+close_connections()
@@ -0,0 +1,118 @@
+import threading
+import time
+from core import jobs
+from core.jobs import JobQueue
+from core.storage import get_connection, transaction
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def _translate(filename, data, target_languages):
+    return data.decode('utf-8'), {language: (f"[{language}] {data.decode('utf-8')}", 'en') for language in target_languages}
+
+
+def _file_row(db_path, job_id, position=0):
+    return get_connection(db_path).execute('SELECT status, owner, translated_text FROM job_files WHERE job_id = ? AND position = ?',
+                                           (job_id, position)).fetchone()
+
+
+# Submit a job to a queue whose workers are not running, so tests drive the files themselves
+def _submit(db_path, text='hello'):
+    return JobQueue(_translate, workers=0, db_path=str(db_path)).submit([('a.txt', text.encode('utf-8'))], 'fr')
+
+
+def _set_running(db_path, job_id, owner, lease_expires):
+    with transaction(db_path) as c:
+        c.execute("UPDATE job_files SET status = 'running', owner = ?, lease_expires = ? WHERE job_id = ?", (owner, lease_expires, job_id))
+
+
+def test_start_requeues_only_expired_leases(tmp_path):
+    db_path = str(tmp_path / 'jobs.db')
+    dead = _submit(db_path, 'dead owner')
+    alive = _submit(db_path, 'live owner')
+    _set_running(db_path, dead, 'dead-owner', time.time() - 1)
+    _set_running(db_path, alive, 'live-owner', time.time() + 60)
+
+    queue = JobQueue(_translate, workers=1, db_path=db_path)
+    queue.start()
+    assert _wait_for(lambda: _file_row(db_path, dead)[0] == 'done')
+    assert _file_row(db_path, dead)[2] == '[fr] dead owner'
+    assert _file_row(db_path, alive)[:2] == ('running', 'live-owner')
+
+
+def test_stale_result_is_dropped(tmp_path):
+    db_path = str(tmp_path / 'jobs.db')
+    job_id = _submit(db_path, 'slow')
+    release = threading.Event()
+    finished = []
+
+    def slow(filename, data, target_languages):
+        release.wait(5)
+        return 'stale', {'fr': ('stale result', 'en')}
+
+    first = JobQueue(slow, workers=0, db_path=db_path, on_file_done=lambda *args: finished.append('first'))
+    worker = threading.Thread(target=first._run, args=(job_id, 0))
+    worker.start()
+    assert _wait_for(lambda: _file_row(db_path, job_id)[0] == 'running')
+
+    # The first owner stops renewing its lease and another queue takes the file over
+    with transaction(db_path) as c:
+        c.execute('UPDATE job_files SET lease_expires = ? WHERE job_id = ?', (time.time() - 1, job_id))
+    second = JobQueue(_translate, workers=1, db_path=db_path, on_file_done=lambda *args: finished.append('second'))
+    second.start()
+    assert _wait_for(lambda: _file_row(db_path, job_id)[0] == 'done')
+
+    release.set()
+    worker.join(5)
+    assert _file_row(db_path, job_id) == ('done', None, '[fr] slow')
+    assert finished == ['second']
+
+
+def test_claim_race_processes_a_file_once(tmp_path):
+    db_path = str(tmp_path / 'jobs.db')
+    job_id = _submit(db_path)
+    calls = []
+    barrier = threading.Barrier(4)
+
+    def count(filename, data, target_languages):
+        calls.append(filename)
+        return _translate(filename, data, target_languages)
+
+    queues = [JobQueue(count, workers=0, db_path=db_path) for _ in range(4)]
+
+    def run(queue):
+        barrier.wait()
+        queue._run(job_id, 0)
+
+    threads = [threading.Thread(target=run, args=(queue,)) for queue in queues]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert calls == ['a.txt']
+    assert _file_row(db_path, job_id)[0] == 'done'
+
+
+def test_purge_removes_expired_jobs(tmp_path):
+    db_path = str(tmp_path / 'jobs.db')
+    queue = JobQueue(_translate, workers=0, db_path=db_path, ttl=60)
+    old = queue.submit([('a.txt', b'old')], 'fr')
+    queue._run(old, 0)
+    with transaction(db_path) as c:
+        c.execute('UPDATE jobs SET updated_at = ? WHERE id = ?', (jobs._now(-120), old))
+    recent = queue.submit([('b.txt', b'recent')], 'fr')
+    queue._run(recent, 0)
+    unfinished = queue.submit([('c.txt', b'queued')], 'fr')
+
+    assert queue.purge() == 1
+    assert queue.get(old) is None
+    assert get_connection(db_path).execute('SELECT COUNT(*) FROM job_translations WHERE job_id = ?', (old,)).fetchone()[0] == 0
+    assert queue.get(recent)['status'] == 'done'
+    assert queue.get(unfinished)['status'] == 'queued'
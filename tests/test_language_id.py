@@ -0,0 +1,99 @@
+import pytest
+from core.language_id import detect_language, same_language, SKIP_CONFIDENCE
+from core.translator_client import TranslatorClient, FakeBackend, TokenBucket, set_client
+
+CATALAN = ("La casa és molt gran i té un jardí amb arbres. El nostre poble és petit però bonic, i la gent és molt "
+           "amable amb tothom que ve a visitar-lo durant les festes de l'estiu.")
+BOSNIAN = ("Sva ljudska bića rađaju se slobodna i jednaka u dostojanstvu i pravima. Ona su obdarena razumom i "
+           "sviješću i trebaju jedno prema drugome postupati u duhu bratstva. Bosna i Hercegovina je država u "
+           "jugoistočnoj Evropi, na Balkanskom poluotoku.")
+
+
+# Texts whose script is used by a single language may skip translation
+@pytest.mark.parametrize('text, code', [
+    ("모든 인간은 태어날 때부터 자유로우며 그 존엄과 권리에 있어 동등하다.", 'ko'),
+    ("มนุษย์ทั้งหลายเกิดมามีอิสระและเสมอภาคกันในเกียรติศักดิ์และสิทธิ", 'th'),
+    ("Όλοι οι άνθρωποι γεννιούνται ελεύθεροι και ίσοι στην αξιοπρέπεια και τα δικαιώματα.", 'el'),
+    ("すべての人間は、生まれながらにして自由であり、かつ、尊厳と権利とについて平等である。", 'ja'),
+])
+def test_single_language_script_is_confident(text, code):
+    detected, confidence = detect_language(text)
+    assert detected == code
+    assert confidence >= SKIP_CONFIDENCE
+
+
+# Scripts shared by several languages must never be confident enough to skip translation
+@pytest.mark.parametrize('text', [
+    # Ukrainian without ї, є or ґ reads as Russian
+    "Всі люди народжуються вільними і рівними у своїй гідності та правах.",
+    # Russian with ъ
+    "Объявление о подъезде к зданию будет опубликовано завтра.",
+    # Nepali reads as Hindi
+    "सबै मानिसहरू जन्मजात स्वतन्त्र हुन् र तिनीहरूको समान अधिकार र महत्व हुन्छ।",
+    # Traditional Chinese reads as Simplified
+    "人人生而自由，在尊嚴和權利上一律平等。他們賦有理性和良心。",
+    # Persian without its own letters reads as Arabic
+    "تمام افراد بشر آزاد به دنیا می آیند و از لحاظ حیثیت و حقوق با هم برابرند.",
+])
+def test_shared_script_is_not_confident(text):
+    _, confidence = detect_language(text)
+    assert confidence < SKIP_CONFIDENCE
+
+
+def test_hard_sign_is_not_bulgarian():
+    detected, _ = detect_language("Объявление о подъезде к зданию будет опубликовано завтра.")
+    assert detected != 'bg'
+
+
+def test_distinguishing_letters_still_name_the_language():
+    assert detect_language("Україна має свою історію, і її мова є державною.")[0] == 'uk'
+
+
+def test_latin_text():
+    text = ("Alle Menschen sind frei und gleich an Würde und Rechten geboren. Sie sind mit Vernunft und Gewissen "
+            "begabt und sollen einander im Geist der Brüderlichkeit begegnen.")
+    detected, confidence = detect_language(text)
+    assert detected == 'de'
+    assert confidence >= SKIP_CONFIDENCE
+
+
+# Near-neighbour Latin languages must not be confident enough to skip translation
+@pytest.mark.parametrize('text', [
+    CATALAN,
+    BOSNIAN,
+    # Serbian Latin reads as Croatian
+    "Sva ljudska bića rađaju se slobodna i jednaka u dostojanstvu i pravima. Ona su obdarena razumom i svešću i "
+    "treba jedni prema drugima da postupaju u duhu bratstva. Srbija je država u jugoistočnoj Evropi.",
+    # Portuguese with Spanish as a close runner-up
+    "A Constituição brasileira estabelece que todos os cidadãos têm o direito de participar nos assuntos públicos, "
+    "diretamente ou por meio de representantes livremente eleitos em eleições periódicas.",
+])
+def test_latin_family_is_not_confident(text):
+    _, confidence = detect_language(text)
+    assert confidence < SKIP_CONFIDENCE
+
+
+# Catalan to Spanish and Bosnian to Croatian still go to the backend
+@pytest.mark.parametrize('text, target', [(CATALAN, 'es'), (BOSNIAN, 'hr')])
+def test_latin_family_is_translated(text, target):
+    pytest.importorskip('googletrans')
+    from core.translation import translate_text
+    backend = FakeBackend()
+    previous = set_client(TranslatorClient(backend, rate_limiter=TokenBucket(rate=0)))
+    try:
+        translated_text, _ = translate_text(text, target)
+    finally:
+        set_client(previous)
+    assert backend.calls == 1
+    assert translated_text.startswith(f"[{target}] ")
+
+
+def test_no_letters():
+    assert detect_language("12345 !?") == (None, 0.0)
+
+
+def test_same_language_aliases():
+    assert same_language('he', 'iw')
+    assert same_language('zh', 'zh-cn')
+    assert not same_language('zh-tw', 'zh-cn')
+    assert not same_language(None, 'en')